@@ -1,30 +1,71 @@
-from flask import Flask, jsonify
+import json
+import click
+from flask import Flask, current_app, jsonify
+from flask.cli import with_appcontext
 from database import init_db, db
-import models as models
+from cache import init_cache
+from metrics import init_metrics
+from profiling import init_profiling
+from health import init_health, stats_snapshot
+from search import create_search_index
+from bulk import import_exam_stream, insert_exam_stream
+from parsers.markdown_parser import iter_markdown
+from utils import to_bulk_question
+from ingest import ingest_directory
+from parse_cache import ParseCache
+from similarity import init_similarity, index_pending, rebuild_index
 from routes.exams import exams_bp
 from routes.questions import questions_bp
 from routes.subquestions import subquestions_bp
 from routes.subsections import subsections_bp
+from routes.search import search_bp
+from routes.solutions import solutions_bp
+from routes.sync import sync_bp
+from routes.health import health_bp
 
-app = Flask(__name__)
+def create_app():
+    """
+    Builds the app without touching the database, so it is cheap to create
+    and safe to preload in a prefork server. Tables are created by init-db.
+    """
+    app = Flask(__name__)
 
-# Initialize database
-init_db(app)
+    # Initialize database
+    init_db(app)
+    init_cache(app)
+    init_metrics(app)
+    init_profiling(app)
+    init_health(app)
+    init_similarity(app)
 
-# Register blueprints
-app.register_blueprint(exams_bp, url_prefix='/api/exams')
-app.register_blueprint(questions_bp, url_prefix='/api/questions')
-app.register_blueprint(subquestions_bp, url_prefix='/api/subquestions')
-app.register_blueprint(subsections_bp, url_prefix='/api/subsections')
+    # Register blueprints
+    app.register_blueprint(exams_bp, url_prefix='/api/exams')
+    app.register_blueprint(questions_bp, url_prefix='/api/questions')
+    app.register_blueprint(subquestions_bp, url_prefix='/api/subquestions')
+    app.register_blueprint(subsections_bp, url_prefix='/api/subsections')
+    app.register_blueprint(search_bp, url_prefix='/api/search')
+    app.register_blueprint(solutions_bp, url_prefix='/api/solutions')
+    app.register_blueprint(sync_bp, url_prefix='/api/sync')
+    app.register_blueprint(health_bp, url_prefix='/health')
+    app.add_url_rule('/', 'health_check', health_check)
+
+    for command in (
+        init_db_command,
+        import_exams_command,
+        import_markdown_command,
+        ingest_dir_command,
+        rebuild_similarity_command
+    ):
+        app.cli.add_command(command)
+    return app
 
-@app.route('/')
 def health_check():
     try:
-        # Simple database check
-        exam_count = models.Exam.query.count()
+        # Served from the cached stats snapshot; probes should use /health/live and /health/ready
+        stats = stats_snapshot.get(current_app.config['STATS_REFRESH_SECONDS'])
         return jsonify({
             'status': 'healthy',
-            'exams_in_database': exam_count
+            'exams_in_database': stats['exams']
         })
     except Exception as e:
         return jsonify({
@@ -32,11 +73,134 @@ def health_check():
             'message': str(e)
         }), 500
 
-@app.cli.command("init-db")
+@click.command("init-db")
+@with_appcontext
 def init_db_command():
-    """Create database tables"""
-    db.create_all()
+    """Create database tables, indexes and the search index"""
+    # Replicas get the tables through replication
+    db.create_all(bind_key=None)
+    # create_all skips tables that already exist, so add columns and indexes declared since
+    add_missing_columns()
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    create_search_index()
     print("Database tables created")
 
+def add_missing_columns():
+    """
+    Adds model columns that existing tables lack. A column with a Python
+    default (e.g. updated_at) is backfilled with it: a NOT NULL one is added
+    NOT NULL with that value as a constant default, which fills the old rows,
+    and the default is then dropped where the database allows it (SQLite
+    keeps it, unused, as ALTER TABLE there cannot drop it). Nullable ones are
+    added nullable and filled with an UPDATE.
+    """
+    inspector = db.inspect(db.engine)
+    dialect = db.engine.dialect
+    preparer = dialect.identifier_preparer
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                table_name, column_name = preparer.format_table(table), preparer.format_column(column)
+                backfill = None
+                if column.default is not None and column.default.is_callable:
+                    backfill = column.default.arg(None)
+                ddl = f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column.type.compile(dialect=dialect)}"
+                if backfill is not None and not column.nullable:
+                    literal = db.literal(backfill, column.type).compile(dialect=dialect, compile_kwargs={'literal_binds': True})
+                    ddl += f" NOT NULL DEFAULT {literal}"
+                # Sent as is: the literal default must not be parsed for bind parameters
+                connection.exec_driver_sql(ddl)
+                if backfill is not None and not column.nullable:
+                    if dialect.name != 'sqlite':
+                        connection.execute(db.text(f"ALTER TABLE {table_name} ALTER COLUMN {column_name} DROP DEFAULT"))
+                elif backfill is not None:
+                    connection.execute(table.update().values({column.name: backfill}))
+                print(f"Added column {table.name}.{column.name}")
+
+@click.command("import-exams")
+@with_appcontext
+@click.argument("path", type=click.File('rb'))
+def import_exams_command(path):
+    """Import exams from an NDJSON file (or - for stdin), one bulk payload per line"""
+    created = failed = 0
+    for result in import_exam_stream(path):
+        if result['status'] == 'created':
+            created += 1
+        else:
+            failed += 1
+        print(json.dumps(result))
+    print(f"Imported {created} exams, {failed} failed")
+    print_indexed(index_pending())
+
+@click.command("import-markdown")
+@with_appcontext
+@click.argument("path", type=click.File('r', encoding='utf-8'))
+@click.option("--year", type=int, required=True)
+@click.option("--subject", required=True)
+@click.option("--province")
+@click.option("--month")
+def import_markdown_command(path, year, subject, province, month):
+    """Parse a markdown paper line by line and import it as one exam"""
+    exam_data = {'year': year, 'subject': subject, 'province': province, 'month': month}
+    questions = (
+        to_bulk_question(question, sort_order)
+        for sort_order, question in enumerate(iter_markdown(path), start=1)
+    )
+    try:
+        exam = insert_exam_stream(exam_data, questions)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    print(f"Imported exam {exam.id}")
+    print_indexed(index_pending())
+
+@click.command("ingest-dir")
+@with_appcontext
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@click.option("--year", type=int, help="Default exam year for papers without a .exam.json sidecar")
+@click.option("--subject", help="Default exam subject")
+@click.option("--province")
+@click.option("--month")
+@click.option("--workers", type=int, help="Parser processes, defaults to the CPU count")
+@click.option("--batch-size", type=int, default=20, show_default=True, help="Exams per commit")
+@click.option("--no-cache", is_flag=True, help="Re-parse and re-import every file")
+def ingest_dir_command(directory, year, subject, province, month, workers, batch_size, no_cache):
+    """Parse every markdown / PDF JSON paper in a directory in parallel and import them"""
+    exam_defaults = {'year': year, 'subject': subject, 'province': province, 'month': month}
+    cache = None if no_cache else ParseCache(current_app.config['PARSE_CACHE_PATH'], current_app.config['PARSE_CACHE_MAX_BYTES'])
+    try:
+        stats = ingest_directory(directory, exam_defaults, workers=workers, batch_size=batch_size, cache=cache)
+    finally:
+        if cache:
+            cache.close()
+    for failure in stats['failed']:
+        print(f"FAILED {failure['path']}: {failure['error']}")
+    seconds = stats['seconds'] or 1e-9
+    print(
+        f"Imported {stats['files']} files ({stats['questions']} questions), "
+        f"{len(stats['failed'])} failed in {stats['seconds']:.2f}s: "
+        f"{stats['files'] / seconds:.1f} files/s, {stats['questions'] / seconds:.1f} questions/s"
+    )
+    if cache:
+        print(f"Parse cache: {cache.hits} hits, {cache.misses} misses, {stats['unchanged']} unchanged files skipped")
+    print_indexed(index_pending())
+
+def print_indexed(exams):
+    print(f"Indexed {exams} exams for near-duplicate search")
+
+@click.command("rebuild-similarity")
+@with_appcontext
+@click.option("--batch-size", type=int, default=1000, show_default=True)
+def rebuild_similarity_command(batch_size):
+    """Recompute the near-duplicate question index from scratch"""
+    total = rebuild_index(batch_size)
+    print(f"Indexed {total} subquestions and subsections")
+
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
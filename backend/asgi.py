@@ -0,0 +1,8 @@
+"""
+ASGI entry point for the async read API in async_api.py:
+
+    uvicorn asgi:app --workers 4
+"""
+from async_api import create_async_app
+
+app = create_async_app()
@@ -0,0 +1,208 @@
+"""
+Async serving mode for the read endpoints, on an async SQLAlchemy engine
+(aiosqlite / aiomysql). It answers the same URLs with byte-identical JSON,
+so the load balancer can send GET traffic for these paths here:
+
+    uvicorn asgi:app --workers 4
+
+    GET /api/exams/
+    GET /api/exams/{id}/full
+    GET /api/questions/{id}
+    GET /api/subquestions/{id}
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+from contextlib import asynccontextmanager
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import selectinload
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+from config import Config
+from cache import LRUCache, exam_cache
+from database import pinned_to_primary
+from models import Exam, Question, SubQuestion, count_by
+from projection import fields_key, parse_fields, question_tree_options
+from routes.exams import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, after_cursor, encode_cursor, exam_filters, exam_summary,
+    full_exam_dict, full_exam_query
+)
+from routes.questions import question_dict
+from routes.subquestions import subquestion_dict
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'mysql': 'mysql+aiomysql'}
+
+def async_url(url):
+    """The async-driver equivalent of a sync database URL"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for {backend}")
+    url = url.set(drivername=ASYNC_DRIVERS[backend])
+    if backend == 'sqlite' and url.database and url.database != ':memory:' and not os.path.isabs(url.database):
+        # Same place Flask-SQLAlchemy puts relative SQLite paths
+        url = url.set(database=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', url.database))
+    if backend == 'mysql' and 'charset' not in url.query:
+        url = url.update_query_dict({'charset': 'utf8mb4'})
+    return url
+
+def create_engines():
+    """Primary plus replica engines; every endpoint here is a read, so replicas are preferred"""
+    options = dict(Config.SQLALCHEMY_ENGINE_OPTIONS)
+    replicas = [
+        create_async_engine(async_url(bind.pop('url')), **bind)
+        for bind in (dict(b) for b in Config.SQLALCHEMY_BINDS.values())
+    ]
+    return create_async_engine(async_url(Config.SQLALCHEMY_DATABASE_URI), **options), replicas
+
+def json_response(data, status=200, headers=None):
+    """Serialized exactly as Flask's jsonify does outside debug mode"""
+    body = json.dumps(data, sort_keys=True, separators=(',', ':')) + '\n'
+    return Response(body, status_code=status, media_type='application/json', headers=headers)
+
+def error_response(message, status):
+    return json_response({'error': message}, status)
+
+class ReadAPI:
+    def __init__(self, primary, replicas):
+        self.primary = primary
+        self.replicas = replicas
+        self._sessions = {
+            engine: async_sessionmaker(engine, expire_on_commit=False)
+            for engine in [primary] + replicas
+        }
+
+    def session(self, request):
+        """
+        A session on a random replica, or on the primary while the client's
+        read_primary_until cookie says it wrote through the Flask app
+        """
+        if self.replicas and not pinned_to_primary(request.cookies):
+            return self._sessions[random.choice(self.replicas)]()
+        return self._sessions[self.primary]()
+
+    async def get_exams(self, request):
+        """Same filters and pagination as the sync GET /api/exams/"""
+        args = request.query_params
+        try:
+            query = select(Exam).where(*exam_filters(args))
+            async with self.session(request) as session:
+                if 'limit' not in args and 'cursor' not in args:
+                    counts = count_by(Question.exam_id)
+                    rows = await session.execute(query.add_columns(
+                        func.coalesce(counts.c.count, 0)
+                    ).outerjoin(counts, counts.c.parent_id == Exam.id).order_by(Exam.year, Exam.id))
+                    return json_response([exam_summary(e, question_count) for e, question_count in rows])
+
+                limit = min(int(args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+                if limit < 1:
+                    raise ValueError('limit must be positive')
+                if args.get('cursor'):
+                    query = query.where(after_cursor(args['cursor']))
+                exams = (await session.scalars(query.order_by(Exam.year, Exam.id).limit(limit + 1))).all()
+                next_cursor = None
+                if len(exams) > limit:
+                    exams = exams[:limit]
+                    next_cursor = encode_cursor(exams[-1].year, exams[-1].id)
+
+                question_counts = {}
+                if exams:
+                    counts = count_by(Question.exam_id, [e.id for e in exams])
+                    question_counts = dict((await session.execute(select(counts.c.parent_id, counts.c.count))).all())
+            return json_response({
+                'exams': [exam_summary(e, question_counts.get(e.id, 0)) for e in exams],
+                'next_cursor': next_cursor
+            })
+        except ValueError as e:
+            return error_response(str(e), 400)
+        except Exception as e:
+            logger.error(f"Error fetching exams: {str(e)}")
+            return error_response('Database error', 500)
+
+    async def get_full_exam(self, request):
+        """Shares the versioned body cache, ETag scheme and projections of the sync route"""
+        exam_id = request.path_params['exam_id']
+        try:
+            fields = parse_fields(request.query_params)
+            async with self.session(request) as session:
+                exam = await session.get(Exam, exam_id)
+                if exam is None:
+                    return error_response('Exam not found', 404)
+                entry = exam_cache.get(exam, fields_key(fields))
+                if entry is None:
+                    questions = (await session.scalars(full_exam_query(fields).filter_by(exam_id=exam.id))).all()
+                    body = json_response(full_exam_dict(exam, questions, fields)).body
+                    entry = (body, hashlib.sha256(body).hexdigest())
+                    exam_cache.set(exam, entry, fields_key(fields))
+
+            body, etag = entry
+            headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+            if f'"{etag}"' in request.headers.get('if-none-match', ''):
+                return Response(status_code=304, headers=headers)
+            return Response(body, media_type='application/json', headers=headers)
+        except ValueError as e:
+            return error_response(str(e), 400)
+        except Exception as e:
+            logger.error(f"Error fetching full exam {exam_id}: {str(e)}")
+            return error_response('Database error', 500)
+
+    async def get_question(self, request):
+        question_id = request.path_params['question_id']
+        try:
+            fields = parse_fields(request.query_params)
+            async with self.session(request) as session:
+                question = (await session.scalars(select(Question).options(
+                    *question_tree_options(fields)
+                ).filter_by(id=question_id))).first()
+                if question is None:
+                    return error_response('Question not found', 404)
+                return json_response(question_dict(question, fields))
+        except ValueError as e:
+            return error_response(str(e), 400)
+        except Exception as e:
+            logger.error(f"Error fetching question {question_id}: {str(e)}")
+            return error_response('Database error', 500)
+
+    async def get_subquestion(self, request):
+        subquestion_id = request.path_params['subquestion_id']
+        try:
+            async with self.session(request) as session:
+                subquestion = (await session.scalars(select(SubQuestion).options(
+                    selectinload(SubQuestion.sub_sections)
+                ).filter_by(id=subquestion_id))).first()
+                if subquestion is None:
+                    return error_response('Subquestion not found', 404)
+                return json_response(subquestion_dict(subquestion))
+        except Exception as e:
+            logger.error(f"Error fetching subquestion {subquestion_id}: {str(e)}")
+            return error_response('Database error', 500)
+
+def create_async_app():
+    """ASGI app serving the read endpoints; like create_app() it opens no connections"""
+    if exam_cache.backend is None:
+        exam_cache.init_app(None, backend=LRUCache(Config.EXAM_CACHE_SIZE))
+    primary, replicas = create_engines()
+    api = ReadAPI(primary, replicas)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        for engine in [primary] + replicas:
+            await engine.dispose()
+
+    return Starlette(
+        routes=[
+            Route('/api/exams/', api.get_exams, methods=['GET']),
+            Route('/api/exams/{exam_id:int}/full', api.get_full_exam, methods=['GET']),
+            Route('/api/questions/{question_id:int}', api.get_question, methods=['GET']),
+            Route('/api/subquestions/{subquestion_id:int}', api.get_subquestion, methods=['GET']),
+        ],
+        lifespan=lifespan
+    )
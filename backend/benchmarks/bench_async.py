@@ -0,0 +1,144 @@
+"""
+Concurrency benchmark of the read endpoints: the sync Flask app under
+gunicorn threads against the async API under uvicorn, both on the same
+throwaway SQLite file. Each round fires --requests GETs at a given number
+of concurrent clients, mixing /api/exams/, /api/exams/<id>/full,
+/api/questions/<id> and /api/subquestions/<id>.
+
+    python benchmarks/bench_async.py [--concurrency 10 50 200] [--requests 2000] [--workers 1] [--threads 8]
+
+Needs gunicorn, uvicorn and httpx on top of the app's requirements.
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+import httpx
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def seed(env, exams):
+    """Creates the schema and exams of 8 questions x 4 subquestions x 2 subsections"""
+    os.environ.update(env)
+    from app import create_app
+    from bulk import insert_exam_tree
+    from database import db
+    from search import create_search_index
+    payload = {
+        'exam': {'year': 2023, 'subject': 'Mathematics', 'province': 'GP', 'month': 'November'},
+        'questions': [{
+            'stem': f'Question {q}',
+            'sub_questions': [{
+                'stem': f'Sub-question {q}.{sq} about functions and graphs',
+                'solutions': 'x = 1',
+                'sub_sections': [{'stem': f'Part {ss}', 'solutions': 'y = 2'} for ss in range(1, 3)]
+            } for sq in range(1, 5)]
+        } for q in range(1, 9)]
+    }
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        create_search_index()
+        for _ in range(exams):
+            insert_exam_tree(payload)
+        db.session.commit()
+    return exams, exams * 8, exams * 8 * 4
+
+def start(command, env, port):
+    process = subprocess.Popen(command, cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f'http://127.0.0.1:{port}/api/exams/1/full', timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{command[0]} did not start")
+
+async def load(port, paths, concurrency, total):
+    latencies = []
+    errors = 0
+    queue = iter(paths[:total])
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', limits=limits, timeout=60) as client:
+        async def worker():
+            nonlocal errors
+            for path in queue:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    response.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+    return len(latencies) / elapsed, statistics.median(latencies) * 1000, p99 * 1000, errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--exams', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=1, help='Processes per server')
+    parser.add_argument('--threads', type=int, default=8, help='Threads per gunicorn worker')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}", METRICS_ENABLED='0')
+        exams, questions, subquestions = seed(env, args.exams)
+        rng = random.Random(3)
+        paths = [rng.choice([
+            '/api/exams/',
+            f'/api/exams/{rng.randint(1, exams)}/full',
+            f'/api/questions/{rng.randint(1, questions)}',
+            f'/api/subquestions/{rng.randint(1, subquestions)}'
+        ]) for _ in range(args.requests)]
+
+        sync_port, async_port = free_port(), free_port()
+        servers = {
+            f'sync (gunicorn, {args.threads} threads)': (sync_port, [
+                sys.executable, '-m', 'gunicorn', '-w', str(args.workers), '--threads', str(args.threads),
+                '--keep-alive', '30', '--backlog', '2048',
+                '-b', f'127.0.0.1:{sync_port}', 'wsgi:app'
+            ]),
+            'async (uvicorn)': (async_port, [
+                sys.executable, '-m', 'uvicorn', '--workers', str(args.workers), '--log-level', 'warning',
+                '--port', str(async_port), 'asgi:app'
+            ]),
+        }
+        print(f"{exams} exams, {args.requests} requests per round, {args.workers} worker process(es)")
+        print(f"{'server':<28} {'clients':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for label, (port, command) in servers.items():
+            process = start(command, env, port)
+            try:
+                for concurrency in args.concurrency:
+                    rate, p50, p99, errors = asyncio.run(load(port, paths, concurrency, args.requests))
+                    print(f"{label:<28} {concurrency:>8} {rate:>8.0f} {p50:>8.1f} {p99:>8.1f} {errors:>7}")
+            finally:
+                process.terminate()
+                process.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Compares POST /api/exams/bulk ingestion paths on a throwaway SQLite file:
+the old per-row flush loop against bulk.insert_exam_tree. Both queue each
+exam for the near-duplicate index; draining that queue afterwards is timed
+on its own line.
+
+    python benchmarks/bench_bulk_insert.py [--exams 50] [--questions 10] [--sub-questions 6] [--sub-sections 3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from config import Config
+from database import db, init_db
+from models import Exam, Question, SubQuestion, SubSection
+from bulk import insert_exam_tree
+from similarity import queue_exam, index_pending
+
+def make_payload(n_questions, n_subq, n_subsec):
+    return {
+        'exam': {'year': 2023, 'subject': 'Mathematics', 'province': 'GP', 'month': 'November'},
+        'questions': [{
+            'stem': f'Question {q}',
+            'sort_order': q,
+            'sub_questions': [{
+                'stem': f'Sub-question {q}.{sq}',
+                'solutions': 'x = 1',
+                'sort_order': sq,
+                'sub_sections': [{
+                    'stem': f'Sub-section {q}.{sq}.{ss}',
+                    'solutions': 'y = 2',
+                    'sort_order': ss
+                } for ss in range(1, n_subsec + 1)]
+            } for sq in range(1, n_subq + 1)]
+        } for q in range(1, n_questions + 1)]
+    }
+
+def insert_exam_tree_per_row(data):
+    """The original create_exam_bulk loop, one flush per question and sub-question, queued as bulk does"""
+    exam_data = data['exam']
+    exam = Exam(year=exam_data['year'], subject=exam_data['subject'],
+                province=exam_data.get('province'), month=exam_data.get('month'), _v=1)
+    db.session.add(exam)
+    db.session.flush()
+    for q_data in data.get('questions', []):
+        question = Question(exam_id=exam.id, stem=q_data['stem'], sort_order=q_data.get('sort_order', 1))
+        db.session.add(question)
+        db.session.flush()
+        for sq_data in q_data.get('sub_questions', []):
+            sub_question = SubQuestion(question_id=question.id, stem=sq_data['stem'],
+                                       solutions=sq_data['solutions'], sort_order=sq_data.get('sort_order', 1))
+            db.session.add(sub_question)
+            db.session.flush()
+            for ss_data in sq_data.get('sub_sections', []):
+                db.session.add(SubSection(sub_question_id=sub_question.id, stem=ss_data['stem'],
+                                          solutions=ss_data['solutions'], sort_order=ss_data.get('sort_order', 1)))
+    db.session.flush()
+    queue_exam(exam.id)
+    return exam
+
+def run(label, insert, payload, n_exams, nodes):
+    start = time.perf_counter()
+    for _ in range(n_exams):
+        insert(payload)
+        db.session.commit()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {n_exams / elapsed:10.1f} exams/s {n_exams * nodes / elapsed:12.0f} nodes/s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--exams', type=int, default=50)
+    parser.add_argument('--questions', type=int, default=10)
+    parser.add_argument('--sub-questions', type=int, default=6)
+    parser.add_argument('--sub-sections', type=int, default=3)
+    args = parser.parse_args()
+
+    payload = make_payload(args.questions, args.sub_questions, args.sub_sections)
+    nodes = args.questions * (1 + args.sub_questions * (1 + args.sub_sections))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        app = Flask(__name__)
+        init_db(app)
+        with app.app_context():
+            db.create_all()
+            print(f"{args.exams} exams x {nodes} nodes each")
+            run('per-row', insert_exam_tree_per_row, payload, args.exams, nodes)
+            run('bulk', insert_exam_tree, payload, args.exams, nodes)
+
+            start = time.perf_counter()
+            indexed = index_pending()
+            elapsed = time.perf_counter() - start
+            print(f"{'index':<10} {indexed / elapsed:10.1f} exams/s {indexed * nodes / elapsed:12.0f} nodes/s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Reports lines/sec for the original per-line regex implementation of
+markdown cleaning and classification against the current one, over the
+sample paper in tests/data (whose golden output tests/test_markdown_golden.py checks).
+
+    python benchmarks/bench_markdown_parser.py [--repeat 2000]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+from utils import clean_markdown_line, classify_numbered_line
+
+SAMPLE = os.path.join(BACKEND, 'tests', 'data', 'sample_paper.md')
+
+def clean_markdown_line_original(line):
+    """utils.clean_markdown_line before the patterns were precompiled"""
+    if re.match(r'^[\|:\- ]+$', line.strip()):
+        return None
+    line = re.sub(r'^\#{1,3}\s*(\*{2})?', '', line)
+    line = re.sub(r'(\*{2})?\s*$', '', line)
+    if '|' in line:
+        cells = [cell.strip() for cell in line.split('|') if cell.strip()]
+        line = ' '.join(cells)
+    line = re.sub(r'^\s*[\-\*]{3,}\s*$', '', line)
+    line = re.sub(r'\[\d+\]\s*$', '', line)
+    _remove_all_paren_nums = re.compile(r'\(\d+\)')
+    line = _remove_all_paren_nums.sub('', line)
+    line = re.sub(r'\s{2,}', ' ', line).strip()
+    return line.strip()
+
+def classify_original(cleaned):
+    """The two re.match calls parse_markdown used to make per line"""
+    return (re.match(r'^(\d+\.\d+)(\s+(.*))?$', cleaned)
+            or re.match(r'^(\d+\.\d+\.\d+)(\s+(.*))?$', cleaned))
+
+def lines_per_sec(fn, lines):
+    start = time.perf_counter()
+    for line in lines:
+        fn(line)
+    return len(lines) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    with open(SAMPLE, newline='') as f:
+        text = f.read()
+    lines = text.split('\n') * args.repeat
+
+    def before(line):
+        cleaned = clean_markdown_line_original(line)
+        if cleaned:
+            classify_original(cleaned)
+
+    def after(line):
+        cleaned = clean_markdown_line(line)
+        if cleaned:
+            classify_numbered_line(cleaned)
+
+    print(f"{len(lines)} lines")
+    print(f"before {lines_per_sec(before, lines):12.0f} lines/s")
+    print(f"after  {lines_per_sec(after, lines):12.0f} lines/s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Sizes and build times of the full exam tree under each ?fields= projection,
+on a throwaway SQLite file with solutions a few times longer than stems.
+"Text read" is the stem and solutions bytes loaded from the database.
+
+    python benchmarks/bench_projection.py [--questions 10] [--sub-questions 6] [--sub-sections 3] [--runs 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PROJECTIONS = [('full', ''), ('fields=stem', 'fields=stem'), ('fields=', 'fields=')]
+
+def make_payload(n_questions, n_subq, n_subsec):
+    working = 'Substitute into the formula and simplify step by step. ' * 12
+    return {
+        'exam': {'year': 2023, 'subject': 'Mathematics', 'province': 'GP', 'month': 'November'},
+        'questions': [{
+            'stem': f'Question {q}: consider the function f(x) = x^2 - {q}x + 6.',
+            'sub_questions': [{
+                'stem': f'{q}.{sq} Determine the turning point of f and sketch the graph.',
+                'solutions': working,
+                'sub_sections': [{
+                    'stem': f'{q}.{sq}.{ss} Hence find the range of f.',
+                    'solutions': working
+                } for ss in range(1, n_subsec + 1)]
+            } for sq in range(1, n_subq + 1)]
+        } for q in range(1, n_questions + 1)]
+    }
+
+def text_bytes(questions):
+    """Stem and solutions bytes actually loaded; deferred columns are absent from __dict__"""
+    nodes = list(questions)
+    nodes += [sq for q in questions for sq in q.sub_questions]
+    nodes += [ss for q in questions for sq in q.sub_questions for ss in sq.sub_sections]
+    return sum(
+        len((node.__dict__.get(name) or '').encode())
+        for node in nodes for name in ('stem', 'solutions')
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--questions', type=int, default=10)
+    parser.add_argument('--sub-questions', type=int, default=6)
+    parser.add_argument('--sub-sections', type=int, default=3)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        from flask import jsonify, request
+        from app import create_app
+        from bulk import insert_exam_tree
+        from database import db
+        from models import Exam
+        from projection import parse_fields
+        from routes.exams import full_exam_dict, full_exam_query
+
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            insert_exam_tree(make_payload(args.questions, args.sub_questions, args.sub_sections))
+            db.session.commit()
+
+        print(f"{'projection':<14} {'payload B':>10} {'text read B':>12} {'build ms':>9}")
+        for label, query_string in PROJECTIONS:
+            with app.test_request_context(f'/?{query_string}'):
+                fields = parse_fields(request.args)
+                times = []
+                for _ in range(args.runs):
+                    db.session.expunge_all()
+                    started = time.perf_counter()
+                    exam = db.session.get(Exam, 1)
+                    questions = db.session.scalars(full_exam_query(fields).filter_by(exam_id=exam.id)).all()
+                    body = jsonify(full_exam_dict(exam, questions, fields)).get_data()
+                    times.append((time.perf_counter() - started) * 1000)
+                print(f"{label:<14} {len(body):>10} {text_bytes(questions):>12} {statistics.median(times):>9.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Shows that similar-question lookups through the LSH index stay flat as the
+bank grows, while comparing against every stored signature grows linearly.
+Builds banks of increasing size in a throwaway SQLite file.
+
+    python benchmarks/bench_similarity.py [--sizes 1000 4000 16000] [--queries 50]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from config import Config
+from database import db, init_db
+from models import SubQuestion, SimilaritySignature
+from bulk import insert_exam_tree
+import similarity
+
+VOCABULARY = [f"word{i}" for i in range(2000)]
+PAPER_SIZE = 100
+
+def make_stem(rng):
+    return ' '.join(rng.choice(VOCABULARY) for _ in range(rng.randint(12, 24)))
+
+def near_copy(stem, rng):
+    words = stem.split()
+    words[rng.randrange(len(words))] = rng.choice(VOCABULARY)
+    return ' '.join(words)
+
+def grow_bank(rng, stems, target):
+    """Adds papers until the bank holds target sub-questions, 1 in 10 a near copy"""
+    while len(stems) < target:
+        batch = []
+        for _ in range(PAPER_SIZE):
+            stem = near_copy(rng.choice(stems), rng) if stems and rng.random() < 0.1 else make_stem(rng)
+            batch.append(stem)
+            stems.append(stem)
+        insert_exam_tree({
+            'exam': {'year': 2020, 'subject': 'Benchmark'},
+            'questions': [{'stem': 'Q', 'sub_questions': [{'stem': s, 'solutions': None} for s in batch]}]
+        })
+        db.session.commit()
+
+def brute_force(node_id, threshold):
+    target = similarity._SIGNATURE.unpack(db.session.get(SimilaritySignature, ('sub_question', node_id)).signature)
+    return [
+        row.node_id for row in SimilaritySignature.query
+        if similarity.estimate_similarity(target, similarity._SIGNATURE.unpack(row.signature)) >= threshold
+    ]
+
+def timed(fn, ids):
+    start = time.perf_counter()
+    for node_id in ids:
+        fn(node_id)
+    return (time.perf_counter() - start) / len(ids) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 4000, 16000])
+    parser.add_argument('--queries', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        app = Flask(__name__)
+        init_db(app)
+        with app.app_context():
+            db.create_all()
+            stems = []
+            print(f"{'nodes':>8} {'lsh ms/query':>14} {'brute ms/query':>16}")
+            for size in sorted(args.sizes):
+                grow_bank(rng, stems, size)
+                ids = [row[0] for row in db.session.query(SubQuestion.id).all()]
+                sample = rng.sample(ids, min(args.queries, len(ids)))
+                lsh = timed(lambda i: similarity.find_similar('sub_question', i), sample)
+                brute = timed(lambda i: brute_force(i, 0.6), sample)
+                print(f"{len(ids):>8} {lsh:>14.2f} {brute:>16.2f}")
+
+if __name__ == '__main__':
+    main()
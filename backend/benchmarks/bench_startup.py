@@ -0,0 +1,54 @@
+"""
+Times worker startup in fresh interpreters: importing the app and calling
+create_app(), against the same plus the schema work every worker used to do
+at import (create_all and the search index check). Runs against a throwaway
+SQLite file that already has the schema, as on a rolling restart.
+
+    python benchmarks/bench_startup.py [--runs 10] [--database-url URL]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STARTUP = """
+import time
+started = time.perf_counter()
+from app import create_app
+app = create_app()
+if {schema}:
+    from database import db
+    from search import create_search_index
+    with app.app_context():
+        db.create_all()
+        create_search_index()
+print(time.perf_counter() - started)
+"""
+
+def startup_seconds(schema, env):
+    output = subprocess.run(
+        [sys.executable, '-c', STARTUP.format(schema=schema)],
+        cwd=BACKEND, env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--database-url', help='Defaults to a throwaway SQLite file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=args.database_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        startup_seconds(True, env)  # creates the schema and warms the bytecode cache
+        print(f"{'startup':<24} {'median ms':>10} {'max ms':>10}")
+        for label, schema in (('create_app()', False), ('create_app() + schema', True)):
+            times = [startup_seconds(schema, env) * 1000 for _ in range(args.runs)]
+            print(f"{label:<24} {statistics.median(times):>10.1f} {max(times):>10.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+import json
+import logging
+
+from models import db, Exam, Question, SubQuestion, SubSection
+from similarity import index_nodes, queue_exam
+
+logger = logging.getLogger(__name__)
+
+QUESTION_BATCH_SIZE = 100
+MAX_PATCH_SIZE = 1000
+
+# Payload key -> (model, similarity node type, patchable columns)
+PATCHABLE = {
+    'questions': (Question, None, ('sort_order', 'stem')),
+    'sub_questions': (SubQuestion, 'sub_question', ('sort_order', 'stem', 'solutions')),
+    'sub_sections': (SubSection, 'sub_section', ('sort_order', 'stem', 'solutions')),
+}
+
+def insert_exam_tree(data):
+    """
+    Inserts an exam and its whole question tree without committing.
+    Each level goes in as one multi-row INSERT, and the generated ids are
+    read back with a single ordered SELECT per level, so a paper costs the
+    same handful of round trips however many nodes it has. The exam is
+    queued for the near-duplicate index rather than indexed here. The caller
+    owns the transaction and rolls back on error to keep the exam all-or-nothing.
+    Raises KeyError for missing required fields before anything is written.
+    """
+    # Support both old and new format
+    exam_data = data['exam'] if 'exam' in data else data
+
+    # Validate the payload up front so a bad node never leaves partial rows
+    exam_row = _exam_row(exam_data)
+    batch = _question_batch(data.get('questions', []))
+
+    exam = Exam(**exam_row)
+    db.session.add(exam)
+    db.session.flush()
+    _insert_question_batch(exam.id, batch)
+    queue_exam(exam.id)
+    return exam
+
+def insert_exam_stream(exam_data, questions, batch_size=QUESTION_BATCH_SIZE):
+    """
+    Like insert_exam_tree, but takes the questions as any iterable (e.g. a
+    parser generator) and inserts them batch_size at a time, so memory is
+    bounded by one batch however long the paper is. Nothing is committed;
+    the caller rolls back on error to keep the exam all-or-nothing.
+    """
+    exam = Exam(**_exam_row(exam_data))
+    db.session.add(exam)
+    db.session.flush()
+
+    last_question_id = None
+    batch = []
+    for q_data in questions:
+        batch.append(q_data)
+        if len(batch) >= batch_size:
+            last_question_id = _insert_question_batch(exam.id, _question_batch(batch), last_question_id)
+            batch = []
+    if batch:
+        _insert_question_batch(exam.id, _question_batch(batch), last_question_id)
+    queue_exam(exam.id)
+    return exam
+
+def _exam_row(exam_data):
+    return {
+        'year': exam_data['year'],
+        'subject': exam_data['subject'],
+        'province': exam_data.get('province'),
+        'month': exam_data.get('month'),
+        '_v': exam_data.get('_v', 1)
+    }
+
+def _question_batch(questions):
+    """Row dicts for each level of a list of question payloads, grouped by parent"""
+    question_rows = [{
+        'stem': q_data['stem'],
+        'sort_order': q_data.get('sort_order', 1)
+    } for q_data in questions]
+    subq_rows = [[{
+        'stem': sq_data['stem'],
+        'solutions': sq_data['solutions'],
+        'sort_order': sq_data.get('sort_order', 1)
+    } for sq_data in q_data.get('sub_questions', [])] for q_data in questions]
+    subsec_rows = [[[{
+        'stem': ss_data['stem'],
+        'solutions': ss_data['solutions'],
+        'sort_order': ss_data.get('sort_order', 1)
+    } for ss_data in sq_data.get('sub_sections', [])]
+        for sq_data in q_data.get('sub_questions', [])] for q_data in questions]
+    return question_rows, subq_rows, subsec_rows
+
+def _insert_question_batch(exam_id, batch, after_id=None):
+    """Inserts one batch under a new exam and returns the last question id"""
+    question_rows, subq_rows, subsec_rows = batch
+
+    # Questions: the exam is new, so every row under it past after_id is
+    # from this batch and ids come back in insertion order
+    question_ids = _insert_children(
+        Question, Question.exam_id, [exam_id], [question_rows], after_id
+    )
+
+    # Sub-questions, grouped under their question ids
+    subq_ids = _insert_children(
+        SubQuestion, SubQuestion.question_id, question_ids, subq_rows
+    )
+
+    # Sub-sections are leaves, no ids to map back
+    subsec_groups = [group for q_groups in subsec_rows for group in q_groups]
+    rows = [
+        dict(row, sub_question_id=parent_id)
+        for parent_id, group in zip(subq_ids, subsec_groups)
+        for row in group
+    ]
+    if rows:
+        db.session.execute(SubSection.__table__.insert(), rows)
+
+    return question_ids[-1] if question_ids else after_id
+
+def _insert_children(model, parent_column, parent_ids, groups, after_id=None):
+    """
+    Inserts groups[i] under parent_ids[i] with one executemany and returns
+    the new ids flattened in payload order.
+    """
+    rows = [
+        dict(row, **{parent_column.key: parent_id})
+        for parent_id, group in zip(parent_ids, groups)
+        for row in group
+    ]
+    if not rows:
+        return []
+    db.session.execute(model.__table__.insert(), rows)
+
+    # Autoincrement ids within a statement follow row order, and the parents
+    # were created in this transaction, so ordering by (parent, id) lines the
+    # rows up with the payload
+    position = {parent_id: i for i, parent_id in enumerate(parent_ids)}
+    query = db.session.query(model.id, parent_column).filter(parent_column.in_(parent_ids))
+    if after_id is not None:
+        query = query.filter(model.id > after_id)
+    inserted = query.order_by(model.id).all()
+    inserted.sort(key=lambda row: position[row[1]])
+    return [row[0] for row in inserted]
+
+def import_exam_stream(lines):
+    """
+    Imports exams from an iterable of NDJSON lines (str or bytes), one bulk
+    payload per line. Each exam is committed in its own transaction and a
+    result dict is yielded as soon as it is done, so only one exam is ever
+    held in memory and a bad line never affects the others.
+    """
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            payload = json.loads(line)
+            if not isinstance(payload, dict):
+                yield {'line': line_number, 'status': 'error', 'error': 'Exam payload must be a JSON object'}
+                continue
+            exam = insert_exam_tree(payload)
+            db.session.commit()
+            yield {'line': line_number, 'status': 'created', 'exam_id': exam.id}
+        except ValueError as e:
+            db.session.rollback()
+            yield {'line': line_number, 'status': 'error', 'error': f'Invalid JSON: {str(e)}'}
+        except KeyError as e:
+            db.session.rollback()
+            yield {'line': line_number, 'status': 'error', 'error': f'Missing required field: {str(e)}'}
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error importing exam on line {line_number}: {str(e)}")
+            yield {'line': line_number, 'status': 'error', 'error': 'Database error'}
+        finally:
+            # Drop the committed tree so memory stays flat across the batch
+            db.session.expunge_all()
+
+def patch_exam_nodes(exam_id, changes):
+    """
+    Applies lists of {id, sort_order, stem, solutions} changes to an exam's
+    questions, subquestions and subsections with one set-based UPDATE per
+    table, without committing. Each column is set with a CASE over the ids
+    that change it, so a whole reorder is a single statement and rows never
+    pass through an intermediate order. Raises ValueError for a malformed
+    payload, values of the wrong type or ids outside the exam; returns the
+    number of rows per table.
+    """
+    patches = {}
+    for key, (model, node_type, columns) in PATCHABLE.items():
+        items = changes.get(key) or []
+        if not isinstance(items, list):
+            raise ValueError(f'{key} must be a list')
+        rows = {}
+        for item in items:
+            if not isinstance(item, dict) or not is_int(item.get('id')):
+                raise ValueError(f'Each entry in {key} must be an object with an integer id')
+            unknown = set(item) - {'id', *columns}
+            if unknown:
+                raise ValueError(f'Cannot patch {", ".join(sorted(unknown))} on {key}')
+            if item['id'] in rows:
+                raise ValueError(f'Duplicate id {item["id"]} in {key}')
+            for column in columns:
+                if column in item:
+                    check_node_value(model, column, item[column], f'{key} id {item["id"]}')
+            rows[item['id']] = item
+        if rows:
+            patches[key] = rows
+    if sum(len(rows) for rows in patches.values()) > MAX_PATCH_SIZE:
+        raise ValueError(f'At most {MAX_PATCH_SIZE} changes per request')
+
+    foreign = {}
+    for key, rows in patches.items():
+        owned = set(db.session.scalars(_in_exam(PATCHABLE[key][0], exam_id).where(
+            PATCHABLE[key][0].id.in_(rows)
+        )))
+        missing = sorted(set(rows) - owned)
+        if missing:
+            foreign[key] = missing
+    if foreign:
+        raise ValueError('Not part of exam {}: {}'.format(exam_id, '; '.join(
+            f'{key} {ids}' for key, ids in foreign.items()
+        )))
+
+    updated = {}
+    for key, rows in patches.items():
+        model, node_type, columns = PATCHABLE[key]
+        values = {}
+        for column in columns:
+            whens = {node_id: item[column] for node_id, item in rows.items() if column in item}
+            if whens:
+                values[column] = db.case(whens, value=model.id, else_=getattr(model, column))
+        if values:
+            db.session.execute(
+                db.update(model).where(model.id.in_(rows)).values(values),
+                execution_options={'synchronize_session': False}
+            )
+        stems = [(node_id, item['stem']) for node_id, item in rows.items() if 'stem' in item]
+        if node_type and stems:
+            index_nodes(node_type, stems)
+        updated[key] = len(rows)
+    return updated
+
+def check_node_value(model, column, value, where):
+    """
+    Raises ValueError unless value suits a node column: sort_order an
+    integer, stem and solutions a string, or null where the column allows it
+    """
+    if column == 'sort_order':
+        valid = is_int(value)
+        expected = 'an integer'
+    else:
+        nullable = model.__table__.c[column].nullable
+        valid = isinstance(value, str) or (value is None and nullable)
+        expected = 'a string or null' if nullable else 'a string'
+    if not valid:
+        raise ValueError(f'{column} of {where} must be {expected}')
+
+def is_int(value):
+    """JSON integers only; bool is an int subclass in Python"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def batch_rows(key, model, items, columns):
+    """
+    Row dicts of the given columns for a batch create, checked before
+    anything is written. A missing sort_order (or null) is numbered by
+    append_children; other missing columns are null, or an error when
+    the column is NOT NULL. Raises ValueError.
+    """
+    rows = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ValueError(f'Each entry in {key} must be an object')
+        row = {}
+        for column in columns:
+            if column not in item and not (column == 'sort_order' or model.__table__.c[column].nullable):
+                raise ValueError(f"Missing required field: '{column}'")
+            row[column] = item.get(column)
+            if not (column == 'sort_order' and row[column] is None):
+                check_node_value(model, column, row[column], f'{key}[{i}]')
+        rows.append(row)
+    return rows
+
+def _in_exam(model, exam_id):
+    """SELECT of the ids of model rows belonging to the exam"""
+    query = db.select(model.id)
+    if model is SubSection:
+        query = query.join(SubQuestion, SubQuestion.id == SubSection.sub_question_id)
+    if model in (SubSection, SubQuestion):
+        query = query.join(Question, Question.id == SubQuestion.question_id)
+    return query.where(Question.exam_id == exam_id)
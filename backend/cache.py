@@ -0,0 +1,61 @@
+import threading
+from collections import OrderedDict
+from config import Config
+
+class LRUCache:
+    """
+    Size-bounded in-process cache. Any object with the same get/set/clear
+    methods can be passed to init_cache as a backend instead.
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+class ExamCache:
+    """
+    Serialized full exam trees keyed on exam id, Exam._v and
+    Exam.updated_at, and on the projection for trees with fewer fields.
+    Writes bump _v (and with it updated_at), so stale entries are never read
+    again and simply age out of the LRU. id and _v alone can repeat, as _v
+    is client-supplied on create and SQLite reuses a deleted exam's id, so
+    updated_at tells a re-created exam from the deleted one.
+    """
+    def __init__(self):
+        self.backend = None
+
+    def init_app(self, app, backend=None):
+        self.backend = backend if backend is not None else LRUCache(app.config['EXAM_CACHE_SIZE'])
+
+    def get(self, exam, variant=''):
+        return self.backend.get(self._key(exam, variant))
+
+    def set(self, exam, entry, variant=''):
+        self.backend.set(self._key(exam, variant), entry)
+
+    def _key(self, exam, variant):
+        return f"exam:{exam.id}:v{exam._v}:{exam.updated_at.isoformat()}{variant}"
+
+exam_cache = ExamCache()
+
+def init_cache(app, backend=None):
+    app.config.setdefault('EXAM_CACHE_SIZE', Config.EXAM_CACHE_SIZE)
+    exam_cache.init_app(app, backend)
@@ -1,12 +1,92 @@
+import os
+import random
+import time
+from flask import current_app, has_request_context, request
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
 from config import Config
 
-db = SQLAlchemy()
+READ_METHODS = ('GET', 'HEAD')
+STICKY_COOKIE = 'read_primary_until'
+
+class RoutingSession(Session):
+    """
+    Sends the reads of GET/HEAD requests to a replica bind, and everything
+    else to the primary. The replica is chosen at random once per session,
+    so all reads of a request see the same snapshot. Once a session has
+    written, and for REPLICA_STICKY_SECONDS afterwards for the same client,
+    reads stay on the primary so they see the write.
+    """
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or getattr(clause, 'is_dml', False):
+                self.info['wrote'] = True
+            elif self._reads_from_replica():
+                replica = self._replica()
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _replica(self):
+        if 'replica' not in self.info:
+            replicas = [engine for key, engine in self._db.engines.items() if key and key.startswith('replica_')]
+            self.info['replica'] = random.choice(replicas) if replicas else None
+        return self.info['replica']
+
+    def _reads_from_replica(self):
+        if self.info.get('wrote') or not has_request_context() or request.method not in READ_METHODS:
+            return False
+        return not pinned_to_primary(request.cookies)
+
+def pinned_to_primary(cookies):
+    """Whether the client wrote recently enough that its reads must see the primary"""
+    try:
+        return float(cookies.get(STICKY_COOKIE, 0)) >= time.time()
+    except ValueError:
+        return False
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 def init_db(app):
+    """
+    Binds the app to its engines without connecting; tables are created by
+    flask init-db, not at startup.
+    """
     app.config.from_object(Config)
     db.init_app(app)
-    
-    # Create tables if they don't exist
+    app.after_request(_stick_to_primary)
+
+    # A worker forked from a preloading master must not reuse the master's
+    # pooled connections, so each child starts with empty pools
     with app.app_context():
-        db.create_all()
\ No newline at end of file
+        engines = list(db.engines.values())
+    for engine in engines:
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', _enable_foreign_keys)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=lambda: [engine.dispose(close=False) for engine in engines])
+
+def _enable_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores ON DELETE CASCADE unless asked per connection
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
+
+def will_write():
+    """
+    Marks the request's session as writing before it has, for views whose
+    writes happen while the response streams, after the cookie is set
+    """
+    db.session.info['wrote'] = True
+
+def _stick_to_primary(response):
+    if db.session.info.get('wrote') and any(key for key in db.engines if key and key.startswith('replica_')):
+        sticky_seconds = current_app.config['REPLICA_STICKY_SECONDS']
+        response.set_cookie(
+            STICKY_COOKIE,
+            str(time.time() + sticky_seconds),
+            max_age=int(sticky_seconds) + 1,
+            httponly=True
+        )
+    return response
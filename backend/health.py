@@ -0,0 +1,76 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from sqlalchemy import text
+from database import db
+from config import Config
+from models import Exam, Question, SubQuestion, SubSection
+
+class ReadinessCheck:
+    """
+    SELECT 1 on a pooled connection, given at most READINESS_TIMEOUT seconds.
+    The check runs on a single worker thread, so a hung database makes probes
+    fail fast instead of piling up one stuck connection per probe.
+    """
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='readiness')
+        self._pending = None
+        self._lock = threading.Lock()
+
+    def check(self, engine, timeout):
+        """(ready, error message or None)"""
+        with self._lock:
+            if self._pending is None or self._pending.done():
+                self._pending = self._executor.submit(_select_one, engine)
+            pending = self._pending
+        try:
+            pending.result(timeout=timeout)
+            return True, None
+        except TimeoutError:
+            return False, f"database did not answer within {timeout}s"
+        except Exception as e:
+            return False, str(e)
+
+def _select_one(engine):
+    with engine.connect() as connection:
+        connection.execute(text('SELECT 1'))
+
+class StatsSnapshot:
+    """
+    Row totals recounted at most every STATS_REFRESH_SECONDS. Only the request
+    that finds the snapshot stale recounts; concurrent ones get the old values.
+    """
+    def __init__(self):
+        self._stats = None
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, max_age):
+        if self._stats is None or time.monotonic() - self._refreshed_at > max_age:
+            blocking = self._stats is None
+            if self._lock.acquire(blocking=blocking):
+                try:
+                    if self._stats is None or time.monotonic() - self._refreshed_at > max_age:
+                        self._stats = _count_rows()
+                        self._refreshed_at = time.monotonic()
+                finally:
+                    self._lock.release()
+        return dict(self._stats, age_seconds=round(time.monotonic() - self._refreshed_at, 1))
+
+    def clear(self):
+        self._stats = None
+
+def _count_rows():
+    return {
+        'exams': db.session.query(db.func.count(Exam.id)).scalar(),
+        'questions': db.session.query(db.func.count(Question.id)).scalar(),
+        'sub_questions': db.session.query(db.func.count(SubQuestion.id)).scalar(),
+        'sub_sections': db.session.query(db.func.count(SubSection.id)).scalar()
+    }
+
+readiness = ReadinessCheck()
+stats_snapshot = StatsSnapshot()
+
+def init_health(app):
+    app.config.setdefault('READINESS_TIMEOUT', Config.READINESS_TIMEOUT)
+    app.config.setdefault('STATS_REFRESH_SECONDS', Config.STATS_REFRESH_SECONDS)
@@ -0,0 +1,150 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from database import db
+from models import Exam
+from bulk import insert_exam_tree
+from parsers import markdown_parser, pdf_parser
+from utils import to_bulk_question
+
+logger = logging.getLogger(__name__)
+
+MARKDOWN_EXTENSIONS = ('.md', '.markdown')
+PDF_JSON_EXTENSIONS = ('.json',)
+# Optional per-paper exam metadata, e.g. paper.md -> paper.exam.json
+SIDECAR_SUFFIX = '.exam.json'
+
+def find_source_files(directory):
+    """Markdown and Marker PDF JSON papers under directory, in a stable order"""
+    paths = []
+    for root, dirs, names in os.walk(directory):
+        dirs.sort()
+        for name in sorted(names):
+            if name.endswith(SIDECAR_SUFFIX):
+                continue
+            if name.lower().endswith(MARKDOWN_EXTENSIONS + PDF_JSON_EXTENSIONS):
+                paths.append(os.path.join(root, name))
+    return paths
+
+def sidecar_path(path):
+    return os.path.splitext(path)[0] + SIDECAR_SUFFIX
+
+def parse_source_file(path, exam_defaults):
+    """
+    Parses one paper into a bulk payload. Runs in a worker process, so it
+    never touches the database and reports failures instead of raising.
+    Returns (path, payload, error) with exactly one of payload/error set.
+    """
+    try:
+        exam_data = {k: v for k, v in exam_defaults.items() if v is not None}
+        sidecar = sidecar_path(path)
+        if os.path.exists(sidecar):
+            with open(sidecar, encoding='utf-8') as f:
+                exam_data.update(json.load(f))
+
+        if path.lower().endswith(MARKDOWN_EXTENSIONS):
+            with open(path, encoding='utf-8') as f:
+                questions = [
+                    to_bulk_question(question, sort_order)
+                    for sort_order, question in enumerate(markdown_parser.iter_markdown(f), start=1)
+                ]
+        else:
+            with open(path, 'rb') as f:
+                questions = [
+                    to_bulk_question(question, sort_order)
+                    for sort_order, question in enumerate(pdf_parser.iter_questions_from_json_file(f), start=1)
+                ]
+        return path, {'exam': exam_data, 'questions': questions}, None
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {str(e)}"
+
+def ingest_directory(directory, exam_defaults, workers=None, batch_size=20, cache=None):
+    """
+    Parses every paper under directory across a process pool and writes the
+    results from this process, committing every batch_size exams. At most
+    two parsed papers per worker are waiting at any time, so a slow database
+    throttles parsing instead of letting results pile up in memory. Each exam
+    is written under a savepoint, so a bad file only loses itself.
+    With a ParseCache, files whose content hash is cached skip parsing, and
+    also the write when the exam they produced still exists. Entries are
+    recorded only once the batch holding their exam has committed.
+    Needs an app context. Returns counts, failures and elapsed seconds.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 2
+    stats = {'files': 0, 'questions': 0, 'unchanged': 0, 'failed': [], 'seconds': 0.0}
+    uncommitted = []
+    # Exams written by this run; after a database reset their reused ids
+    # can match the stale cache entries of files not reached yet
+    written = set()
+    start = time.perf_counter()
+
+    paths = iter(find_source_files(directory))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = {}
+        while True:
+            # Top up the pool, but never beyond max_pending parsed-or-parsing files
+            for path in paths:
+                key = cache.key_for(path, sidecar_path(path), exam_defaults) if cache else None
+                cached = cache.get(key) if cache else None
+                if cached:
+                    payload, exam_id = cached
+                    if exam_id is not None and exam_id not in written and db.session.get(Exam, exam_id) is not None:
+                        stats['unchanged'] += 1
+                    else:
+                        written.add(_write_exam(path, payload, key, stats, uncommitted))
+                        _commit_if_full(cache, uncommitted, batch_size)
+                    continue
+                in_flight[pool.submit(parse_source_file, path, exam_defaults)] = key
+                if len(in_flight) >= max_pending:
+                    break
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = in_flight.pop(future)
+                path, payload, error = future.result()
+                if error:
+                    stats['failed'].append({'path': path, 'error': error})
+                else:
+                    written.add(_write_exam(path, payload, key, stats, uncommitted))
+            _commit_if_full(cache, uncommitted, batch_size)
+
+    _commit_batch(cache, uncommitted)
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+def _write_exam(path, payload, key, stats, uncommitted):
+    """Inserts one parsed paper under a savepoint and queues its cache entry; returns the exam id or None"""
+    try:
+        with db.session.begin_nested():
+            exam = insert_exam_tree(payload)
+    except KeyError as e:
+        stats['failed'].append({'path': path, 'error': f"Missing required field: {str(e)}"})
+        return
+    except Exception as e:
+        logger.error(f"Error writing {path}: {str(e)}")
+        stats['failed'].append({'path': path, 'error': 'Database error'})
+        return
+    stats['files'] += 1
+    stats['questions'] += len(payload['questions'])
+    uncommitted.append((key, path, payload, exam.id))
+    return exam.id
+
+def _commit_if_full(cache, uncommitted, batch_size):
+    """Commits once batch_size exams are waiting, dropping them from the session"""
+    if len(uncommitted) >= batch_size:
+        _commit_batch(cache, uncommitted)
+        db.session.expunge_all()
+
+def _commit_batch(cache, uncommitted):
+    """Commits the written exams, then records them in the parse cache"""
+    db.session.commit()
+    if cache:
+        for key, path, payload, exam_id in uncommitted:
+            cache.put(key, path, payload, exam_id)
+    uncommitted.clear()
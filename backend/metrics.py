@@ -0,0 +1,195 @@
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import Config
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+class Histogram:
+    """Non-cumulative bucket counts plus sum; exported cumulatively"""
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+
+class Shard:
+    """
+    Statistics recorded by one thread. Only the owning thread writes to a
+    shard, so requests never contend on a lock; a scrape merges all shards.
+    """
+    def __init__(self):
+        self.latency = {}
+        self.statements = {}
+        self.sql_seconds = {}
+        self.statements_per_request = {}
+
+    def record(self, labels, seconds, statements, sql_seconds):
+        endpoint = labels[0]
+        histogram = self.latency.get(labels)
+        if histogram is None:
+            histogram = self.latency[labels] = Histogram(LATENCY_BUCKETS)
+        histogram.observe(seconds)
+        histogram = self.statements_per_request.get(endpoint)
+        if histogram is None:
+            histogram = self.statements_per_request[endpoint] = Histogram(STATEMENT_BUCKETS)
+        histogram.observe(statements)
+        self.statements[endpoint] = self.statements.get(endpoint, 0) + statements
+        self.sql_seconds[endpoint] = self.sql_seconds.get(endpoint, 0.0) + sql_seconds
+
+    def merge(self, other):
+        for name in ('latency', 'statements_per_request'):
+            target = getattr(self, name)
+            for key, histogram in list(getattr(other, name).items()):
+                if key not in target:
+                    target[key] = Histogram(histogram.bounds)
+                target[key].merge(histogram)
+        for name in ('statements', 'sql_seconds'):
+            target = getattr(self, name)
+            for key, value in list(getattr(other, name).items()):
+                target[key] = target.get(key, 0) + value
+
+class Metrics:
+    """
+    Per-route request latency and SQL statement counts / time, gathered from
+    Flask request hooks and SQLAlchemy engine events. Shards are kept per
+    live thread; those of finished threads are folded into one retired
+    shard, so servers that start a thread per request don't grow without bound.
+    """
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = {}
+        self._retired = Shard()
+        self._shards_lock = threading.Lock()
+        self._listening = False
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENABLED', Config.METRICS_ENABLED)
+        if not app.config['METRICS_ENABLED']:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        if not self._listening:
+            # Listening on the Engine class covers every engine the app creates
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            self._listening = True
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = Shard()
+            with self._shards_lock:
+                self._retire_finished()
+                self._shards[threading.current_thread()] = shard
+        return shard
+
+    def _retire_finished(self):
+        # A finished thread writes no more, so its shard can be merged without racing it
+        for thread in [thread for thread in self._shards if not thread.is_alive()]:
+            self._retired.merge(self._shards.pop(thread))
+
+    def _before_request(self):
+        local = self._local
+        local.started = time.perf_counter()
+        local.statements = 0
+        local.sql_seconds = 0.0
+
+    def _after_request(self, response):
+        self._finish(response.status_code)
+        return response
+
+    def _teardown_request(self, exc):
+        # Only still pending when a view raised and after_request was skipped
+        self._finish(500)
+
+    def _finish(self, status):
+        local = self._local
+        started = getattr(local, 'started', None)
+        if started is None:
+            return
+        local.started = None
+        labels = (request.endpoint or 'unmatched', request.method, str(status))
+        self._shard().record(labels, time.perf_counter() - started, local.statements, local.sql_seconds)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info['metrics_started'] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        local = self._local
+        if getattr(local, 'started', None) is None:
+            return
+        local.statements += 1
+        local.sql_seconds += time.perf_counter() - conn.info.pop('metrics_started', time.perf_counter())
+
+    def collect(self):
+        """Merged view over every thread's shard"""
+        merged = Shard()
+        with self._shards_lock:
+            self._retire_finished()
+            merged.merge(self._retired)
+            shards = list(self._shards.values())
+        for shard in shards:
+            merged.merge(shard)
+        return merged
+
+    def render(self):
+        """Prometheus text exposition format"""
+        merged = self.collect()
+        lines = []
+        _histogram(lines, 'http_request_duration_seconds', 'Request latency by route, method and status',
+                   {_labels(endpoint=e, method=m, status=s): h for (e, m, s), h in merged.latency.items()})
+        _histogram(lines, 'db_statements_per_request', 'SQL statements executed per request by route',
+                   {_labels(endpoint=e): h for e, h in merged.statements_per_request.items()})
+        lines.append('# HELP db_statements_total SQL statements executed by route')
+        lines.append('# TYPE db_statements_total counter')
+        for endpoint, value in sorted(merged.statements.items()):
+            lines.append(f'db_statements_total{{{_labels(endpoint=endpoint)}}} {value}')
+        lines.append('# HELP db_statement_seconds_total Time spent in SQL statements by route')
+        lines.append('# TYPE db_statement_seconds_total counter')
+        for endpoint, value in sorted(merged.sql_seconds.items()):
+            lines.append(f'db_statement_seconds_total{{{_labels(endpoint=endpoint)}}} {value:.6f}')
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+def _labels(**labels):
+    return ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for key, value in labels.items()
+    )
+
+def _histogram(lines, name, help_text, series):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for labels, histogram in sorted(series.items()):
+        cumulative = 0
+        for bound, count in zip(histogram.bounds, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        cumulative += histogram.counts[-1]
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {histogram.sum:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {cumulative}')
+
+metrics = Metrics()
+
+def init_metrics(app):
+    metrics.init_app(app)
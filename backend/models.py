@@ -1,6 +1,22 @@
+from datetime import datetime, timezone
 from database import db
 
+def utcnow():
+    """
+    Naive UTC now for updated_at. Set from Python rather than SQL NOW() so
+    every backend stores the same precision the sync cursors compare against.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 class Exam(db.Model):
+    __table_args__ = (
+        # Keyset pagination over the catalogue, with and without a subject filter
+        db.Index('ix_exam_year_id', 'year', 'id'),
+        db.Index('ix_exam_subject_year_id', 'subject', 'year', 'id'),
+        # Delta sync, see sync.py
+        db.Index('ix_exam_updated', 'updated_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     year = db.Column(db.Integer, nullable=False)
     subject = db.Column(db.String(100), nullable=False)
@@ -8,47 +24,168 @@ class Exam(db.Model):
     month = db.Column(db.String(30))
     _v = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=db.func.now())
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow, onupdate=utcnow)
     questions = db.relationship(
         'Question',
         backref='exam',
         lazy=True,
+        order_by='[Question.sort_order, Question.id]',
         cascade='all, delete-orphan',
         passive_deletes=True
     )
 
 class Question(db.Model):
+    __table_args__ = (
+        # Search index on MySQL; SQLite uses the FTS5 table from search.py
+        db.Index('ft_question_stem', 'stem', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+        # Ordered children of a parent and the next free sort_order
+        db.Index('ix_question_exam_sort', 'exam_id', 'sort_order'),
+        db.Index('ix_question_updated', 'updated_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     exam_id = db.Column(db.Integer, db.ForeignKey('exam.id', ondelete='CASCADE'), nullable=False)
     stem = db.Column(db.Text)
     sort_order = db.Column(db.Integer, default=1)
     created_at = db.Column(db.DateTime, default=db.func.now())
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow, onupdate=utcnow)
     sub_questions = db.relationship(
         'SubQuestion',
         backref='question',
         lazy=True,
+        order_by='[SubQuestion.sort_order, SubQuestion.id]',
         cascade='all, delete-orphan',
         passive_deletes=True
     )
 
 class SubQuestion(db.Model):
+    __table_args__ = (
+        db.Index('ft_sub_question_text', 'stem', 'solutions', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+        db.Index('ix_sub_question_question_sort', 'question_id', 'sort_order'),
+        db.Index('ix_sub_question_updated', 'updated_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     question_id = db.Column(db.Integer, db.ForeignKey('question.id', ondelete='CASCADE'), nullable=False)
     stem = db.Column(db.Text)
     sort_order = db.Column(db.Integer, default=1)
     created_at = db.Column(db.DateTime, default=db.func.now())
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow, onupdate=utcnow)
     solutions = db.Column(db.Text)
     sub_sections = db.relationship(
         'SubSection',
         backref='sub_question',
         lazy=True,
+        order_by='[SubSection.sort_order, SubSection.id]',
         cascade='all, delete-orphan',
         passive_deletes=True
     )
 
 class SubSection(db.Model):
+    __table_args__ = (
+        db.Index('ft_sub_section_text', 'stem', 'solutions', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+        db.Index('ix_sub_section_sub_question_sort', 'sub_question_id', 'sort_order'),
+        db.Index('ix_sub_section_updated', 'updated_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     sub_question_id = db.Column(db.Integer, db.ForeignKey('sub_question.id', ondelete='CASCADE'), nullable=False)
     stem = db.Column(db.Text, nullable=False)
     sort_order = db.Column(db.Integer, default=1)
     solutions = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=db.func.now())
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow, onupdate=utcnow)
+
+class Tombstone(db.Model):
+    """
+    A deleted exam or node, for delta sync. Only the deleted row gets one;
+    its descendants went with it and clients drop the subtree.
+    """
+    __table_args__ = (
+        db.Index('ix_tombstone_deleted', 'deleted_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    node_type = db.Column(db.String(20), nullable=False)
+    node_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+class SimilaritySignature(db.Model):
+    """MinHash signature of a sub-question or sub-section stem, see similarity.py"""
+    node_type = db.Column(db.String(20), primary_key=True)
+    node_id = db.Column(db.Integer, primary_key=True)
+    signature = db.Column(db.LargeBinary, nullable=False)
+
+class SimilarityBucket(db.Model):
+    """One LSH band of a signature; nodes sharing a (band, bucket) are candidates"""
+    __table_args__ = (
+        db.Index('ix_similarity_bucket_lookup', 'band', 'bucket'),
+        db.Index('ix_similarity_bucket_node', 'node_type', 'node_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    node_type = db.Column(db.String(20), nullable=False)
+    node_id = db.Column(db.Integer, nullable=False)
+    band = db.Column(db.SmallInteger, nullable=False)
+    bucket = db.Column(db.BigInteger, nullable=False)
+
+class SimilarityPending(db.Model):
+    """An exam inserted in bulk whose nodes are not indexed yet, see similarity.index_pending"""
+    exam_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+def count_by(column, parent_ids=None):
+    """
+    Grouped COUNT subquery of child rows per parent, keyed on the given
+    foreign key column. parent_ids (a list or a SELECT of ids) limits the
+    count to those parents instead of grouping the whole child table.
+    """
+    query = db.select(
+        column.label('parent_id'),
+        db.func.count().label('count')
+    )
+    if parent_ids is not None:
+        query = query.where(column.in_(parent_ids))
+    return query.group_by(column).subquery()
+
+def bump_exam_version(exam_id):
+    """Increment Exam._v in SQL so cached copies of the exam tree are invalidated"""
+    Exam.query.filter_by(id=exam_id).update(
+        {Exam._v: Exam._v + 1}, synchronize_session=False
+    )
+
+def record_deletion(node_type, node_id):
+    """Tombstone for a deleted 'exam', 'question', 'sub_question' or 'sub_section', in the caller's transaction"""
+    db.session.add(Tombstone(node_type=node_type, node_id=node_id))
+
+def next_sort_order(model, parent_column, parent_id):
+    """
+    One past the parent's highest child sort_order, read off the
+    (parent, sort_order) index. Only race-free while the caller holds a lock
+    on the parent row (with_for_update), which every appending route takes.
+    """
+    return db.session.query(
+        db.func.coalesce(db.func.max(model.sort_order), 0)
+    ).filter(parent_column == parent_id).scalar() + 1
+
+def append_children(model, parent_column, parent_id, rows):
+    """
+    Inserts row dicts under one parent with a single executemany and returns
+    them with their new ids. Rows without a sort_order are numbered after the
+    parent's current last child, from one next_sort_order for the whole
+    batch. The caller holds a lock on the parent row, so no other batch can
+    append under it meanwhile and the new ids are the parent's last len(rows) ids.
+    """
+    next_order = next_sort_order(model, parent_column, parent_id)
+    rows = [dict(row, **{parent_column.key: parent_id}) for row in rows]
+    for row in rows:
+        if row.get('sort_order') is None:
+            row['sort_order'] = next_order
+            next_order += 1
+    db.session.execute(model.__table__.insert(), rows)
+
+    ids = db.session.scalars(
+        db.select(model.id).where(parent_column == parent_id).order_by(model.id.desc()).limit(len(rows))
+    ).all()
+    for row, new_id in zip(rows, reversed(ids)):
+        row['id'] = new_id
+    return rows
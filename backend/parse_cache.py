@@ -0,0 +1,87 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+from parsers import markdown_parser, pdf_parser
+
+class ParseCache:
+    """
+    On-disk cache of parsed papers in a local SQLite file, keyed by a hash
+    of the source bytes, its sidecar metadata, the exam defaults and the
+    parser version. Each entry remembers the exam it was written as, so a
+    re-run can skip both parsing and the database write. Least recently used
+    entries are evicted once the stored payloads exceed max_bytes.
+    """
+    def __init__(self, path, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS parse_cache ('
+            ' key TEXT PRIMARY KEY,'
+            ' path TEXT NOT NULL,'
+            ' payload TEXT NOT NULL,'
+            ' exam_id INTEGER,'
+            ' size INTEGER NOT NULL,'
+            ' last_used REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS ix_parse_cache_last_used ON parse_cache (last_used)')
+        self._conn.commit()
+
+    def key_for(self, path, sidecar, exam_defaults):
+        """Content hash of everything that determines the parsed payload"""
+        if path.lower().endswith(('.md', '.markdown')):
+            parser = f"markdown:{markdown_parser.PARSER_VERSION}"
+        else:
+            parser = f"pdf_json:{pdf_parser.PARSER_VERSION}"
+        digest = hashlib.sha256(parser.encode())
+        digest.update(json.dumps(exam_defaults, sort_keys=True).encode())
+        for source in (path, sidecar):
+            digest.update(b'\0')
+            try:
+                with open(source, 'rb') as f:
+                    for block in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(block)
+            except FileNotFoundError:
+                pass
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Returns (payload, exam_id) and counts a hit, or None and counts a miss"""
+        row = self._conn.execute(
+            'SELECT payload, exam_id FROM parse_cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._conn.execute('UPDATE parse_cache SET last_used = ? WHERE key = ?', (time.time(), key))
+        self._conn.commit()
+        return json.loads(row[0]), row[1]
+
+    def put(self, key, path, payload, exam_id):
+        data = json.dumps(payload)
+        self._conn.execute(
+            'INSERT OR REPLACE INTO parse_cache (key, path, payload, exam_id, size, last_used) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (key, path, data, exam_id, len(data), time.time())
+        )
+        self._evict()
+        self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM parse_cache').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+            'SELECT key, size FROM parse_cache ORDER BY last_used'
+        ).fetchall():
+            self._conn.execute('DELETE FROM parse_cache WHERE key = ?', (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def close(self):
+        self._conn.close()
@@ -1,14 +1,21 @@
-import re
+from utils import clean_markdown_line, classify_numbered_line
 
-from utils import clean_markdown_line
+# Bump whenever parser output changes so cached parse results are invalidated
+PARSER_VERSION = 2
 
 def parse_markdown(markdown_content):
     """
     Parses markdown content into structured questions and sub-questions
     using state tracking and pattern matching
     """
-    lines = markdown_content.split('\n')
-    questions = []
+    return list(iter_markdown(markdown_content.split('\n')))
+
+def iter_markdown(lines):
+    """
+    Streaming form of parse_markdown over any iterable of lines, such as an
+    open file. Each question is yielded as soon as the next one starts, so
+    only the question being built is held in memory.
+    """
     current_question = None
     current_subq = None
     in_math_block = False
@@ -41,13 +48,14 @@ def parse_markdown(markdown_content):
             math_block_lines.append(cleaned)
             continue
 
+        numbered = classify_numbered_line(cleaned)
+
         # Detect question starters (number followed by text)
-        question_match = re.match(r'^(\d+\.\d+)(\s+(.*))?$', cleaned)
-        if question_match:
+        if numbered and numbered[0] == 'question':
             # Finalize previous question if exists
             if current_question:
                 if current_subq:
-                    questions.append(current_question)
+                    current_question['sub_questions'].append(current_subq)
                     current_subq = None
                 else:
                     # Handle questions without sub-questions
@@ -55,20 +63,19 @@ def parse_markdown(markdown_content):
                         'sub_question_number': current_question['question_number'] + '.1',
                         'content': current_question['stem']
                     }]
-                    questions.append(current_question)
+                yield current_question
             
             # Start new question
             current_question = {
-                'question_number': question_match.group(1),
-                'stem': question_match.group(3) if question_match.group(3) else '',
+                'question_number': numbered[1],
+                'stem': numbered[2],
                 'sub_questions': []
             }
             current_subq = None
             continue
 
         # Detect sub-question starters
-        subq_match = re.match(r'^(\d+\.\d+\.\d+)(\s+(.*))?$', cleaned)
-        if subq_match:
+        if numbered:
             if current_question:
                 # Finalize previous sub-question
                 if current_subq:
@@ -76,8 +83,8 @@ def parse_markdown(markdown_content):
                 
                 # Start new sub-question
                 current_subq = {
-                    'sub_question_number': subq_match.group(1),
-                    'content': subq_match.group(3) if subq_match.group(3) else ''
+                    'sub_question_number': numbered[1],
+                    'content': numbered[2]
                 }
             continue
 
@@ -93,6 +100,4 @@ def parse_markdown(markdown_content):
     if current_subq and current_question:
         current_question['sub_questions'].append(current_subq)
     if current_question:
-        questions.append(current_question)
-    
-    return questions
\ No newline at end of file
+        yield current_question
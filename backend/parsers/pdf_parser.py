@@ -1,65 +1,133 @@
+import json
 import re
 import logging
 from typing import Optional
 
+try:
+    import ijson
+except ImportError:  # optional, only needed for the streaming file reader
+    ijson = None
+
 logger = logging.getLogger(__name__)
 
+# Bump whenever parser output changes so cached parse results are invalidated
+PARSER_VERSION = 1
+
+_HTML_TAG = re.compile(r'<[^>]+>')
+_WHITESPACE = re.compile(r'\s+')
+_QUESTION_HEADER = re.compile(r'QUESTION\s*(\d+)', re.IGNORECASE)
+_PAGE_ID = re.compile(r'/page/(\d+)/')
+_MARKS = re.compile(r'\((\d+)\)')
+_TRAILING_MARKS = re.compile(r'\s*\(\d+\)\s*$')
+
+# ijson prefixes of a page and of a top-level block within a page
+_PAGE_PREFIX = 'children.item'
+_BLOCK_PREFIX = 'children.item.children.item'
+
 def extract_questions_from_json(pdf_json):
-    questions = []
+    return list(iter_questions_from_blocks(_iter_blocks(pdf_json)))
+
+def iter_questions_from_json_file(fp):
+    """
+    Streaming form of extract_questions_from_json over an open Marker JSON
+    file. Pages and blocks are read as ijson events and each question is
+    yielded once the next QUESTION header is reached, so peak memory is one
+    question plus one block rather than the whole document. Falls back to
+    json.load when ijson is not installed.
+    """
+    if ijson is None:
+        logger.warning("ijson not installed, loading the whole PDF JSON into memory")
+        return iter_questions_from_blocks(_iter_blocks(json.load(fp)))
+    return iter_questions_from_blocks(_iter_blocks_from_events(ijson.parse(fp)))
+
+def iter_questions_from_blocks(blocks):
+    """Builds questions from (page_number, block) pairs in document order"""
     current_question = None
-    
+
+    for page_number, block in blocks:
+        block_type = block.get('block_type')
+        html = block.get('html', '')
+
+        # New question detection
+        if block_type == 'SectionHeader' and 'QUESTION' in html:
+            if current_question:
+                yield _finished(current_question)
+
+            try:
+                question_number = extract_question_number(html)
+                current_question = {
+                    'page_number': page_number,
+                    'question_number': question_number,
+                    'stem': '',
+                    'content_html': html,
+                    'sub_questions': []
+                }
+            except Exception as e:
+                logger.error(f"Error parsing question header: {html} - {str(e)}")
+                current_question = None
+
+        # Add to question content
+        elif current_question and block_type in ['Text', 'TextInlineMath']:
+            try:
+                current_question['stem'] += ' ' + sanitize_text(html)
+                current_question['content_html'] += html
+            except Exception as e:
+                logger.error(f"Error processing text block: {str(e)}")
+
+        # Process sub-questions
+        elif current_question and block_type == 'ListGroup':
+            for item in block.get('children', []):
+                if item.get('block_type') == 'ListItem':
+                    try:
+                        item_html = item.get('html', '')
+                        sq_content = sanitize_text(item_html)
+                        current_question['sub_questions'].append({
+                            'content': extract_subquestion_content(sq_content),
+                            'marks': extract_marks(item_html),
+                            'topics': []  # Will be stored as JSON
+                        })
+                    except Exception as e:
+                        logger.error(f"Error parsing list item: {item_html} - {str(e)}")
+
+    if current_question:
+        yield _finished(current_question)
+
+def _finished(question):
+    # Text blocks are appended with a leading space
+    question['stem'] = question['stem'].strip()
+    return question
+
+def _iter_blocks(pdf_json):
     for page in pdf_json.get('children', []):
         page_number = extract_page_number_from_id(page.get('id', ''))
-        
         for block in page.get('children', []):
-            block_type = block.get('block_type')
-            html = block.get('html', '')
-            
-            # New question detection
-            if block_type == 'SectionHeader' and 'QUESTION' in html:
-                if current_question:
-                    questions.append(current_question)
-                
-                try:
-                    question_number = extract_question_number(html)
-                    current_question = {
-                        'page_number': page_number,
-                        'question_number': question_number,
-                        'stem': '',
-                        'content_html': html,
-                        'sub_questions': []
-                    }
-                except Exception as e:
-                    logger.error(f"Error parsing question header: {html} - {str(e)}")
-                    current_question = None
-            
-            # Add to question content
-            elif current_question and block_type in ['Text', 'TextInlineMath']:
-                try:
-                    current_question['stem'] += ' ' + sanitize_text(html)
-                    current_question['content_html'] += html
-                except Exception as e:
-                    logger.error(f"Error processing text block: {str(e)}")
-            
-            # Process sub-questions
-            elif current_question and block_type == 'ListGroup':
-                for item in block.get('children', []):
-                    if item.get('block_type') == 'ListItem':
-                        try:
-                            item_html = item.get('html', '')
-                            sq_content = sanitize_text(item_html)
-                            current_question['sub_questions'].append({
-                                'content': extract_subquestion_content(sq_content),
-                                'marks': extract_marks(item_html),
-                                'topics': []  # Will be stored as JSON
-                            })
-                        except Exception as e:
-                            logger.error(f"Error parsing list item: {item_html} - {str(e)}")
-    
-    if current_question:
-        questions.append(current_question)
-    
-    return questions
+            yield page_number, block
+
+def _iter_blocks_from_events(events):
+    """
+    Rebuilds one top-level block at a time from ijson parse events. The page
+    number comes from the page id, or from the block's own id when the page
+    id has not been seen yet.
+    """
+    page_number = None
+    builder = None
+    for prefix, event, value in events:
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == _BLOCK_PREFIX and event == 'end_map':
+                block = builder.value
+                builder = None
+                number = page_number
+                if number is None:
+                    number = extract_page_number_from_id(block.get('id', ''))
+                yield number, block
+        elif prefix == _BLOCK_PREFIX and event == 'start_map':
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+        elif prefix == _PAGE_PREFIX and event == 'start_map':
+            page_number = None
+        elif prefix == _PAGE_PREFIX + '.id' and event == 'string':
+            page_number = extract_page_number_from_id(value)
 
 # Helper functions (same as before)
 def sanitize_text(html: str) -> str:
@@ -69,16 +137,16 @@ def sanitize_text(html: str) -> str:
     if not html:
         return ""
     # Remove HTML tags
-    text = re.sub(r'<[^>]+>', '', html)
+    text = _HTML_TAG.sub('', html)
     # Normalize whitespace (replace multiple spaces/newlines with a single space)
-    text = re.sub(r'\s+', ' ', text).strip()
+    text = _WHITESPACE.sub(' ', text).strip()
     return text
 
 def extract_question_number(html_text: str) -> Optional[str]:
     """
     Extracts the question number (e.g., '6') from a header string like 'QUESTION 6'.
     """
-    match = re.search(r'QUESTION\s*(\d+)', html_text, re.IGNORECASE)
+    match = _QUESTION_HEADER.search(html_text)
     return match.group(1) if match else None
 
 def extract_page_number_from_id(element_id: str) -> Optional[int]:
@@ -87,7 +155,7 @@ def extract_page_number_from_id(element_id: str) -> Optional[int]:
     """
     if not element_id:
         return None
-    match = re.search(r'/page/(\d+)/', element_id)
+    match = _PAGE_ID.search(element_id)
     return int(match.group(1)) if match else None
 
 def extract_marks(text: str) -> Optional[int]:
@@ -95,7 +163,7 @@ def extract_marks(text: str) -> Optional[int]:
     Extracts the mark value from a string, looking for a number in parentheses, e.g., (3).
     """
     # Searches for the last occurrence of a number in parentheses
-    matches = re.findall(r'\((\d+)\)', text)
+    matches = _MARKS.findall(text)
     return int(matches[-1]) if matches else None
 
 def extract_subquestion_content(text: str) -> str:
@@ -103,4 +171,4 @@ def extract_subquestion_content(text: str) -> str:
     Removes the mark allocation from the sub-question text to get the clean content.
     """
     # Removes all occurrences of (X) where X is a number
-    return re.sub(r'\s*\(\d+\)\s*$', '', text).strip()
\ No newline at end of file
+    return _TRAILING_MARKS.sub('', text).strip()
@@ -0,0 +1,123 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import time
+from logging.handlers import RotatingFileHandler
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import Config
+
+PROFILE_HEADER = 'X-Profile'
+MAX_PARAMETERS_LENGTH = 1000
+
+slow_query_logger = logging.getLogger('examdb.slow_queries')
+
+class Profiler:
+    """
+    Opt-in cProfile dumps for single requests, taken either for a random
+    PROFILE_SAMPLE_RATE fraction of requests or when the X-Profile header
+    matches PROFILE_TOKEN. Dumps are pstats files in PROFILE_DIR, of which
+    only the newest PROFILE_MAX_FILES are kept.
+    """
+    def init_app(self, app):
+        for key in ('PROFILE_SAMPLE_RATE', 'PROFILE_TOKEN', 'PROFILE_DIR', 'PROFILE_MAX_FILES'):
+            app.config.setdefault(key, getattr(Config, key))
+        self.sample_rate = app.config['PROFILE_SAMPLE_RATE']
+        self.token = app.config['PROFILE_TOKEN']
+        self.directory = app.config['PROFILE_DIR']
+        self.max_files = app.config['PROFILE_MAX_FILES']
+        if self.sample_rate <= 0 and not self.token:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _wanted(self):
+        if self.token and request.headers.get(PROFILE_HEADER) == self.token:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _before_request(self):
+        if self._wanted():
+            g.profile = cProfile.Profile()
+            g.profile.enable()
+
+    def _after_request(self, response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        profile.disable()
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{time.time_ns()}-{request.endpoint or 'unmatched'}.prof"
+        profile.dump_stats(os.path.join(self.directory, name))
+        self._trim()
+        response.headers['X-Profile-Id'] = name
+        return response
+
+    def _trim(self):
+        dumps = sorted(f for f in os.listdir(self.directory) if f.endswith('.prof'))
+        for name in dumps[:-self.max_files]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+class SlowQueryLog:
+    """
+    Logs SQL text, parameters, duration and originating route for every
+    statement slower than SLOW_QUERY_MS, as JSON lines in a size-bounded
+    set of rotating files.
+    """
+    def __init__(self):
+        self._listening = False
+        self.threshold = None
+
+    def init_app(self, app):
+        for key in ('SLOW_QUERY_MS', 'SLOW_QUERY_LOG', 'SLOW_QUERY_LOG_MAX_BYTES', 'SLOW_QUERY_LOG_BACKUPS'):
+            app.config.setdefault(key, getattr(Config, key))
+        if app.config['SLOW_QUERY_MS'] <= 0:
+            return
+        self.threshold = app.config['SLOW_QUERY_MS'] / 1000
+        if not slow_query_logger.handlers:
+            handler = RotatingFileHandler(
+                app.config['SLOW_QUERY_LOG'],
+                maxBytes=app.config['SLOW_QUERY_LOG_MAX_BYTES'],
+                backupCount=app.config['SLOW_QUERY_LOG_BACKUPS'],
+                delay=True
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            slow_query_logger.addHandler(handler)
+            slow_query_logger.setLevel(logging.INFO)
+            slow_query_logger.propagate = False
+        if not self._listening:
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            self._listening = True
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info['slow_query_started'] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('slow_query_started', None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+        if duration < self.threshold:
+            return
+        slow_query_logger.info(json.dumps({
+            'time': time.time(),
+            'duration_ms': round(duration * 1000, 3),
+            'route': request.endpoint if has_request_context() else None,
+            'statement': statement,
+            'parameters': repr(parameters)[:MAX_PARAMETERS_LENGTH],
+            'executemany': executemany
+        }))
+
+profiler = Profiler()
+slow_query_log = SlowQueryLog()
+
+def init_profiling(app):
+    profiler.init_app(app)
+    slow_query_log.init_app(app)
@@ -0,0 +1,53 @@
+from sqlalchemy.orm import load_only, selectinload
+from models import Question, SubQuestion, SubSection
+
+# Text columns a tree response can leave out; ids, parents and sort orders are always sent
+TEXT_FIELDS = ('stem', 'solutions')
+ALL_FIELDS = frozenset(TEXT_FIELDS)
+DEFAULT_INCLUDE_FIELDS = frozenset({'stem'})
+
+def parse_fields(args):
+    """
+    Text fields a tree response should carry. ?fields=stem lists them
+    exactly (an empty value sends ids and sort orders only), ?include=solutions
+    adds to stems-only, and with neither every field is sent as before.
+    Raises ValueError on unknown names.
+    """
+    if 'fields' not in args and 'include' not in args:
+        return ALL_FIELDS
+    base = set(_split_fields(args['fields'])) if 'fields' in args else set(DEFAULT_INCLUDE_FIELDS)
+    return frozenset(base | set(_split_fields(args.get('include', ''))))
+
+def _split_fields(value):
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in TEXT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}; expected any of {', '.join(TEXT_FIELDS)}")
+    return names
+
+def fields_key(fields):
+    """Stable suffix telling projections apart in cache keys; empty for the full tree"""
+    return '' if fields == ALL_FIELDS else ':fields=' + ','.join(sorted(fields))
+
+def columns(model, fields, *always):
+    """load_only() of a model's key columns plus the requested text columns it has"""
+    return load_only(
+        model.id, model.sort_order, *always,
+        *(getattr(model, name) for name in TEXT_FIELDS if name in fields and name in model.__table__.c)
+    )
+
+def text_of(node, fields):
+    """The requested text fields of a loaded node, without touching deferred ones"""
+    return {name: getattr(node, name) for name in TEXT_FIELDS if name in fields and name in node.__table__.c}
+
+def question_tree_options(fields):
+    """Loader options for questions with their subquestions and subsections, deferring unrequested text"""
+    if fields == ALL_FIELDS:
+        return (selectinload(Question.sub_questions).selectinload(SubQuestion.sub_sections),)
+    return (
+        columns(Question, fields, Question.exam_id),
+        selectinload(Question.sub_questions).options(
+            columns(SubQuestion, fields, SubQuestion.question_id),
+            selectinload(SubQuestion.sub_sections).options(columns(SubSection, fields, SubSection.sub_question_id))
+        )
+    )
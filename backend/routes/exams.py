@@ -1,25 +1,101 @@
-from flask import Blueprint, request, jsonify
-from models import db, Exam, Question, SubQuestion, SubSection
+import base64
+import hashlib
+import json
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from models import db, Exam, Question, count_by, bump_exam_version, record_deletion
+from database import will_write
+from cache import exam_cache
+from bulk import insert_exam_tree, import_exam_stream, patch_exam_nodes
+from similarity import remove_tree
+from streaming import wants_stream, stream_exam_tree
+from projection import ALL_FIELDS, fields_key, parse_fields, question_tree_options, text_of
+from utils import iter_lines
 import logging
 
 
 exams_bp = Blueprint('exams', __name__)
 logger = logging.getLogger(__name__)
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(year, exam_id):
+    """Opaque next-page token for the (year, id) keyset"""
+    return base64.urlsafe_b64encode(f"{year}:{exam_id}".encode()).decode()
+
+def decode_cursor(token):
+    """Inverse of encode_cursor, raises ValueError on a malformed token"""
+    try:
+        year, exam_id = base64.urlsafe_b64decode(token.encode()).decode().split(':')
+        return int(year), int(exam_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {token}")
+
+def exam_filters(args):
+    """WHERE clauses for the subject, province, month and year query parameters"""
+    filters = [getattr(Exam, field) == args[field] for field in ('subject', 'province', 'month') if args.get(field)]
+    if args.get('year'):
+        filters.append(Exam.year == int(args['year']))
+    return filters
+
+def after_cursor(token):
+    """Keyset condition for the exams after the given cursor"""
+    year, exam_id = decode_cursor(token)
+    return db.or_(
+        Exam.year > year,
+        db.and_(Exam.year == year, Exam.id > exam_id)
+    )
+
+def exam_summary(exam, question_count):
+    return {
+        'id': exam.id,
+        'year': exam.year,
+        'subject': exam.subject,
+        'province': exam.province,
+        'month': exam.month,
+        '_v': exam._v,
+        'question_count': question_count
+    }
+
 @exams_bp.route('/', methods=['GET'])
 def get_exams():
-    """Get all exams"""
+    """
+    Get all exams, optionally filtered by subject, year, province and month.
+    Passing limit or cursor switches to keyset pagination on (year, id) and
+    wraps the page as {'exams': [...], 'next_cursor': ...}.
+    """
     try:
-        exams = Exam.query.all()
-        return jsonify([{
-            'id': e.id,
-            'year': e.year,
-            'subject': e.subject,
-            'province': e.province,
-            'month': e.month,
-            '_v': e._v,
-            'question_count': len(e.questions)
-        } for e in exams])
+        query = Exam.query.filter(*exam_filters(request.args))
+
+        if 'limit' not in request.args and 'cursor' not in request.args:
+            counts = count_by(Question.exam_id)
+            exams = query.add_columns(
+                db.func.coalesce(counts.c.count, 0)
+            ).outerjoin(counts, counts.c.parent_id == Exam.id).order_by(Exam.year, Exam.id).all()
+            return jsonify([exam_summary(e, question_count) for e, question_count in exams])
+
+        limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        if request.args.get('cursor'):
+            query = query.filter(after_cursor(request.args['cursor']))
+
+        # Fetch one extra row to know whether another page exists
+        exams = query.order_by(Exam.year, Exam.id).limit(limit + 1).all()
+        next_cursor = None
+        if len(exams) > limit:
+            exams = exams[:limit]
+            next_cursor = encode_cursor(exams[-1].year, exams[-1].id)
+
+        counts = count_by(Question.exam_id, [e.id for e in exams])
+        question_counts = dict(db.session.query(counts.c.parent_id, counts.c.count).all()) if exams else {}
+
+        return jsonify({
+            'exams': [exam_summary(e, question_counts.get(e.id, 0)) for e in exams],
+            'next_cursor': next_cursor
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error fetching exams: {str(e)}")
         return jsonify({'error': 'Database error'}), 500
@@ -50,120 +126,133 @@ def get_exam(exam_id):
     """Get a specific exam by ID"""
     try:
         exam = Exam.query.get_or_404(exam_id)
-        return jsonify({
-            'id': exam.id,
-            'year': exam.year,
-            'subject': exam.subject,
-            'province': exam.province,
-            'month': exam.month,
-            '_v': exam._v,
-            'question_count': len(exam.questions)
-        })
+        question_count = db.session.query(db.func.count(Question.id)).filter(
+            Question.exam_id == exam_id
+        ).scalar()
+        return jsonify(exam_summary(exam, question_count))
     except Exception as e:
         logger.error(f"Error fetching exam {exam_id}: {str(e)}")
         return jsonify({'error': 'Database error'}), 500
 
-@exams_bp.route('/<int:exam_id>/full', methods=['GET'])
-def get_full_exam(exam_id):
-    """Get complete exam with all questions, subquestions, and subsections"""
-    try:
-        exam = Exam.query.get_or_404(exam_id)
-        questions = []
-
-        for q in sorted(exam.questions, key=lambda x: (x.sort_order or 0)):
-            question_data = {
-                'id': q.id,
-                'stem': q.stem,
-                'sort_order': q.sort_order,
-                'sub_questions': []
+def full_exam_query(fields=ALL_FIELDS):
+    """
+    Questions with their subquestions and subsections, one SELECT per level.
+    Text columns not in fields are left out of the SELECTs.
+    """
+    return db.select(Question).options(*question_tree_options(fields)).order_by(Question.sort_order, Question.id)
+
+def build_full_exam(exam, fields=ALL_FIELDS):
+    """Nested dict of an exam and its questions, subquestions and subsections"""
+    question_rows = db.session.scalars(full_exam_query(fields).filter_by(exam_id=exam.id)).all()
+    return full_exam_dict(exam, question_rows, fields)
+
+def full_exam_dict(exam, question_rows, fields=ALL_FIELDS):
+    """build_full_exam's output from already loaded questions"""
+    questions = []
+
+    for q in question_rows:
+        question_data = {
+            'id': q.id,
+            **text_of(q, fields),
+            'sort_order': q.sort_order,
+            'sub_questions': []
+        }
+
+        for sq in q.sub_questions:
+            subq_data = {
+                'id': sq.id,
+                **text_of(sq, fields),
+                'sort_order': sq.sort_order,
+                'sub_sections': []
             }
 
-            for sq in sorted(q.sub_questions, key=lambda x: (x.sort_order or 0)):
-                subq_data = {
-                    'id': sq.id,
-                    'stem': sq.stem,
-                    'sort_order': sq.sort_order,
-                    'solutions': sq.solutions,
-                    'sub_sections': []
+            for ss in sq.sub_sections:
+                subsec_data = {
+                    'id': ss.id,
+                    **text_of(ss, fields),
+                    'sort_order': ss.sort_order
                 }
+                subq_data['sub_sections'].append(subsec_data)
 
-                for ss in sorted(sq.sub_sections, key=lambda x: (x.sort_order or 0)):
-                    subsec_data = {
-                        'id': ss.id,
-                        'stem': ss.stem,
-                        'solutions': sq.solutions,
-                        'sort_order': ss.sort_order
-                    }
-                    subq_data['sub_sections'].append(subsec_data)
+            question_data['sub_questions'].append(subq_data)
 
-                question_data['sub_questions'].append(subq_data)
+        questions.append(question_data)
 
-            questions.append(question_data)
+    return {
+        'id': exam.id,
+        'year': exam.year,
+        'subject': exam.subject,
+        'province': exam.province,
+        'month': exam.month,
+        'questions': questions
+    }
 
-        return jsonify({
-            'id': exam.id,
-            'year': exam.year,
-            'subject': exam.subject,
-            'province': exam.province,
-            'month': exam.month,
-            'questions': questions
-        })
+@exams_bp.route('/<int:exam_id>/full', methods=['GET'])
+def get_full_exam(exam_id):
+    """
+    Get complete exam with all questions, subquestions, and subsections.
+    The serialized tree is cached per exam version and carries a strong ETag,
+    so clients can revalidate with If-None-Match and get a 304.
+    With ?stream=1 the tree is streamed straight off the cursor instead.
+    ?fields= and ?include= pick the text fields sent (see projection.py);
+    each projection is cached separately and is never streamed.
+    """
+    try:
+        fields = parse_fields(request.args)
+        exam = Exam.query.get_or_404(exam_id)
+        if wants_stream() and fields == ALL_FIELDS:
+            return Response(stream_with_context(stream_exam_tree(exam)), mimetype='application/json')
+
+        entry = exam_cache.get(exam, fields_key(fields))
+        if entry is None:
+            body = jsonify(build_full_exam(exam, fields)).get_data()
+            entry = (body, hashlib.sha256(body).hexdigest())
+            exam_cache.set(exam, entry, fields_key(fields))
+
+        body, etag = entry
+        response = current_app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error fetching full exam {exam_id}: {str(e)}")
         return jsonify({'error': 'Database error'}), 500
 
+@exams_bp.route('/<int:exam_id>/nodes', methods=['PATCH'])
+def patch_exam_nodes_route(exam_id):
+    """
+    Reorder or edit many questions, subquestions and subsections of an exam
+    in one transaction, e.g. {"sub_questions": [{"id": 4, "sort_order": 1},
+    {"id": 3, "sort_order": 2}]}. Accepts sort_order and stem for questions,
+    plus solutions for subquestions and subsections.
+    """
+    try:
+        data = request.json
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Body must be a JSON object'}), 400
+        # Locking the exam serializes concurrent structural edits to it
+        if Exam.query.with_for_update().filter_by(id=exam_id).first() is None:
+            return jsonify({'error': 'Exam not found'}), 404
+
+        updated = patch_exam_nodes(exam_id, data)
+        bump_exam_version(exam_id)
+        db.session.commit()
+        return jsonify({'exam_id': exam_id, 'updated': updated})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error patching nodes of exam {exam_id}: {str(e)}")
+        return jsonify({'error': 'Database error'}), 500
+
 @exams_bp.route('/bulk', methods=['POST'])
 def create_exam_bulk():
     """Create exam with all questions, subquestions, and subsections in one request"""
     try:
-        data = request.json
-        # Create exam - support both old and new format
-        if 'exam' in data:
-            exam_data = data['exam']
-        else:
-            exam_data = data
-            
-        exam = Exam(
-            year=exam_data['year'],
-            subject=exam_data['subject'],
-            province=exam_data.get('province'),
-            month=exam_data.get('month'),
-            _v=exam_data.get('_v', 1)
-        )
-        db.session.add(exam)
-        db.session.flush()  # Get exam ID without committing
-        
-        # Process questions hierarchy
-        for q_data in data.get('questions', []):
-            question = Question(
-                exam_id=exam.id,
-                stem=q_data['stem'],
-                sort_order=q_data.get('sort_order', 1)
-            )
-            db.session.add(question)
-            db.session.flush()
-            
-            # Process sub-questions
-            for sq_data in q_data.get('sub_questions', []):
-                sub_question = SubQuestion(
-                    question_id=question.id,
-                    stem=sq_data['stem'],
-                    solutions=sq_data['solutions'],
-                    sort_order=sq_data.get('sort_order', 1)
-                )
-                db.session.add(sub_question)
-                db.session.flush()
-                
-                # Process sub-sections
-                for ss_data in sq_data.get('sub_sections', []):
-                    sub_section = SubSection(
-                        sub_question_id=sub_question.id,
-                        stem=ss_data['stem'],
-                        solutions=ss_data['solutions'],
-                        sort_order=ss_data.get('sort_order', 1)
-                    )
-                    db.session.add(sub_section)
-        
+        exam = insert_exam_tree(request.json)
         db.session.commit()
         
         return jsonify({
@@ -179,11 +268,30 @@ def create_exam_bulk():
         logger.error(f"Error creating bulk exam: {str(e)}")
         return jsonify({'error': 'Database error'}), 500
 
+@exams_bp.route('/import', methods=['POST'])
+def import_exams():
+    """
+    Import many exams from an NDJSON body, one bulk payload per line.
+    The body is read in chunks and split into lines, and each exam commits
+    on its own; the response streams back one NDJSON result per exam as it
+    finishes.
+    """
+    # Headers go out before the first exam is written
+    will_write()
+
+    def generate():
+        for result in import_exam_stream(iter_lines(request.stream)):
+            yield json.dumps(result) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @exams_bp.route('/<int:exam_id>', methods=['DELETE'])
 def delete_exam(exam_id):
     """Delete an exam and all its questions/subquestions/subsections"""
     try:
         exam = Exam.query.get_or_404(exam_id)
+        record_deletion('exam', exam.id)
+        remove_tree(Question.exam_id, [exam.id])
         db.session.delete(exam)
         db.session.commit()
         
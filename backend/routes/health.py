@@ -0,0 +1,31 @@
+from flask import Blueprint, current_app, jsonify
+from database import db
+from health import readiness, stats_snapshot
+import logging
+
+
+health_bp = Blueprint('health', __name__)
+logger = logging.getLogger(__name__)
+
+@health_bp.route('/live', methods=['GET'])
+def liveness():
+    """The process is up and serving requests; never touches the database"""
+    return jsonify({'status': 'alive'})
+
+@health_bp.route('/ready', methods=['GET'])
+def readiness_check():
+    """The database answers SELECT 1 within READINESS_TIMEOUT seconds"""
+    ready, error = readiness.check(db.engine, current_app.config['READINESS_TIMEOUT'])
+    if not ready:
+        logger.error(f"Readiness check failed: {error}")
+        return jsonify({'status': 'unavailable', 'message': error}), 503
+    return jsonify({'status': 'ready'})
+
+@health_bp.route('/stats', methods=['GET'])
+def stats():
+    """Row totals from a snapshot refreshed at most every STATS_REFRESH_SECONDS"""
+    try:
+        return jsonify(stats_snapshot.get(current_app.config['STATS_REFRESH_SECONDS']))
+    except Exception as e:
+        logger.error(f"Error counting rows for stats: {str(e)}")
+        return jsonify({'error': 'Database error'}), 500
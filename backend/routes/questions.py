@@ -1,11 +1,51 @@
-from flask import Blueprint, request, jsonify
-from models import db, Exam, Question, SubQuestion, SubSection
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from sqlalchemy.orm import selectinload
+from models import db, Exam, Question, SubQuestion, SubSection, count_by, bump_exam_version, append_children, next_sort_order, record_deletion
+from streaming import wants_stream, stream_question_tree
+from projection import ALL_FIELDS, parse_fields, question_tree_options, text_of
+from similarity import remove_tree
+from bulk import batch_rows, is_int
+from utils import parse_ids
 import logging
 
 
 questions_bp = Blueprint('questions', __name__)
 logger = logging.getLogger(__name__)
 
+MAX_BATCH_SIZE = 500
+MAX_IDS = 100
+
+def question_dict(question, fields=ALL_FIELDS):
+    """A question with its subquestions and subsections, all already loaded"""
+    # Get subquestions
+    subquestions = []
+    for sq in question.sub_questions:
+        subq_data = {
+            'id': sq.id,
+            **text_of(sq, fields),
+            'sort_order': sq.sort_order,
+            'sub_sections': []
+        }
+
+        # Get subsections
+        for ss in sq.sub_sections:
+            subsec_data = {
+                'id': ss.id,
+                **text_of(ss, fields),
+                'sort_order': ss.sort_order
+            }
+            subq_data['sub_sections'].append(subsec_data)
+
+        subquestions.append(subq_data)
+
+    return {
+        'id': question.id,
+        'exam_id': question.exam_id,
+        **text_of(question, fields),
+        'sort_order': question.sort_order,
+        'sub_questions': subquestions
+    }
+
 @questions_bp.route('/', methods=['POST'])
 def create_question():
     """Create a new question for an exam"""
@@ -16,12 +56,11 @@ def create_question():
         if not exam_id:
             return jsonify({'error': 'exam_id is required'}), 400
             
-        # Verify exam exists
-        exam = Exam.query.get_or_404(exam_id)
+        # Verify exam exists, locking it so concurrent appends get distinct sort orders
+        exam = Exam.query.with_for_update().get_or_404(exam_id)
         
         # Get next sort order
-        last_question = Question.query.filter_by(exam_id=exam_id).order_by(Question.sort_order.desc()).first()
-        next_order = last_question.sort_order + 1 if last_question else 1
+        next_order = next_sort_order(Question, Question.exam_id, exam_id)
         
         question = Question(
             exam_id=exam_id,
@@ -29,6 +68,7 @@ def create_question():
             sort_order=data.get('sort_order', next_order)
         )
         db.session.add(question)
+        bump_exam_version(exam_id)
         db.session.commit()
         
         return jsonify({
@@ -44,43 +84,98 @@ def create_question():
         logger.error(f"Error creating question: {str(e)}")
         return jsonify({'error': 'Database error'}), 500
 
+@questions_bp.route('/batch', methods=['POST'])
+def create_questions_batch():
+    """
+    Append many questions to an exam in one transaction. Questions without
+    a sort_order are numbered after the exam's last question, in order.
+    """
+    exam_id = None
+    try:
+        data = request.json
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Body must be a JSON object'}), 400
+        exam_id = data.get('exam_id')
+        items = data.get('questions')
+
+        if not exam_id:
+            return jsonify({'error': 'exam_id is required'}), 400
+        if not is_int(exam_id):
+            return jsonify({'error': 'exam_id must be an integer'}), 400
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'questions must be a non-empty list'}), 400
+        if len(items) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'At most {MAX_BATCH_SIZE} questions per batch'}), 400
+        rows = batch_rows('questions', Question, items, ('stem', 'sort_order'))
+        if db.session.get(Exam, exam_id, with_for_update=True) is None:
+            return jsonify({'error': 'Exam not found'}), 404
+
+        questions = append_children(Question, Question.exam_id, exam_id, rows)
+        bump_exam_version(exam_id)
+        db.session.commit()
+
+        return jsonify({
+            'exam_id': exam_id,
+            'ids': [q['id'] for q in questions],
+            'questions': [{
+                'id': q['id'],
+                'stem': q['stem'],
+                'sort_order': q['sort_order'],
+                'question_number': f"Q{q['sort_order']}"
+            } for q in questions]
+        }), 201
+
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error creating questions for exam {exam_id}: {str(e)}")
+        return jsonify({'error': 'Database error'}), 500
+
+@questions_bp.route('/', methods=['GET'])
+def get_questions():
+    """
+    Get many questions with their subquestions and subsections, e.g.
+    ?ids=3,1,2, in three queries whatever the number of ids. Results keep
+    the requested order; ids that do not exist are listed under missing.
+    """
+    try:
+        ids = parse_ids(request.args.get('ids'), MAX_IDS)
+        found = {q.id: q for q in Question.query.options(
+            selectinload(Question.sub_questions)
+            .selectinload(SubQuestion.sub_sections)
+        ).filter(Question.id.in_(ids))}
+        return jsonify({
+            'questions': [question_dict(found[i]) for i in ids if i in found],
+            'missing': [i for i in ids if i not in found]
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error fetching questions {request.args.get('ids')}: {str(e)}")
+        return jsonify({'error': 'Database error'}), 500
+
 @questions_bp.route('/<int:question_id>', methods=['GET'])
 def get_question(question_id):
-    """Get a specific question by ID"""
+    """
+    Get a specific question by ID, streamed off the cursor with ?stream=1.
+    ?fields= and ?include= pick the text fields sent, as for the full exam.
+    """
     try:
-        question = Question.query.get_or_404(question_id)
-        
-        # Get subquestions
-        subquestions = []
-        for sq in sorted(question.sub_questions, key=lambda x: (x.sort_order or 0)):
-            subq_data = {
-                'id': sq.id,
-                'stem': sq.stem,
-                'sort_order': sq.sort_order,
-                'solutions': sq.solutions,
-                'sub_sections': []
-            }
-            
-            # Get subsections
-            for ss in sorted(sq.sub_sections, key=lambda x: (x.sort_order or 0)):
-                subsec_data = {
-                    'id': ss.id,
-                    'stem': ss.stem,
-                    'solutions': ss.solutions,
-                    'sort_order': ss.sort_order
-                }
-                subq_data['sub_sections'].append(subsec_data)
-            
-            subquestions.append(subq_data)
+        fields = parse_fields(request.args)
+        if wants_stream() and fields == ALL_FIELDS:
+            question = Question.query.get_or_404(question_id)
+            return Response(stream_with_context(stream_question_tree(question)), mimetype='application/json')
+
+        question = Question.query.options(
+            *question_tree_options(fields)
+        ).filter_by(id=question_id).first_or_404()
         
-        return jsonify({
-            'id': question.id,
-            'exam_id': question.exam_id,
-            'stem': question.stem,
-            'sort_order': question.sort_order,
-            'sub_questions': subquestions
-        })
+        return jsonify(question_dict(question, fields))
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error fetching question {question_id}: {str(e)}")
         return jsonify({'error': 'Database error'}), 500
@@ -97,6 +192,7 @@ def update_question(question_id):
         if 'sort_order' in data:
             question.sort_order = data['sort_order']
             
+        bump_exam_version(question.exam_id)
         db.session.commit()
         
         return jsonify({
@@ -116,6 +212,9 @@ def delete_question(question_id):
     """Delete a question and all its subquestions/subsections"""
     try:
         question = Question.query.get_or_404(question_id)
+        bump_exam_version(question.exam_id)
+        record_deletion('question', question.id)
+        remove_tree(SubQuestion.question_id, [question.id])
         db.session.delete(question)
         db.session.commit()
         
@@ -130,15 +229,21 @@ def delete_question(question_id):
 def get_questions_by_exam(exam_id):
     """Get all questions for a specific exam"""
     try:
-        exam = Exam.query.get_or_404(exam_id)
+        Exam.query.get_or_404(exam_id)
+        counts = count_by(SubQuestion.question_id, db.select(Question.id).where(Question.exam_id == exam_id))
+        rows = db.session.query(
+            Question, db.func.coalesce(counts.c.count, 0)
+        ).outerjoin(
+            counts, counts.c.parent_id == Question.id
+        ).filter(Question.exam_id == exam_id).order_by(Question.sort_order, Question.id).all()
         questions = []
         
-        for q in sorted(exam.questions, key=lambda x: (x.sort_order or 0)):
+        for q, sub_questions_count in rows:
             question_data = {
                 'id': q.id,
                 'stem': q.stem,
                 'sort_order': q.sort_order,
-                'sub_questions_count': len(q.sub_questions)
+                'sub_questions_count': sub_questions_count
             }
             questions.append(question_data)
         
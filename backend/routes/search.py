@@ -0,0 +1,40 @@
+from flask import Blueprint, request, jsonify
+from search import search_nodes
+import logging
+
+
+search_bp = Blueprint('search', __name__)
+logger = logging.getLogger(__name__)
+
+MAX_RESULTS = 50
+
+@search_bp.route('/', methods=['GET'])
+def search():
+    """Ranked full-text search over question, subquestion and subsection text"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'q is required'}), 400
+        limit = min(int(request.args.get('limit', 20)), MAX_RESULTS)
+        offset = int(request.args.get('offset', 0))
+        if limit < 1 or offset < 0:
+            raise ValueError('limit must be positive and offset non-negative')
+        year = int(request.args['year']) if request.args.get('year') else None
+
+        results, has_more = search_nodes(
+            query,
+            subject=request.args.get('subject'),
+            year=year,
+            limit=limit,
+            offset=offset
+        )
+        return jsonify({
+            'query': query,
+            'results': results,
+            'next_offset': offset + limit if has_more else None
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error searching for {request.args.get('q')}: {str(e)}")
+        return jsonify({'error': 'Database error'}), 500
@@ -0,0 +1,46 @@
+from flask import Blueprint, request, jsonify
+from models import db, SubQuestion, SubSection
+from utils import parse_ids
+import logging
+
+
+solutions_bp = Blueprint('solutions', __name__)
+logger = logging.getLogger(__name__)
+
+MAX_IDS = 200
+
+# Query parameter and response key for each kind of node that has solutions
+SOLUTION_MODELS = {'sub_questions': SubQuestion, 'sub_sections': SubSection}
+
+@solutions_bp.route('/', methods=['GET'])
+def get_solutions():
+    """
+    Solutions of many nodes at once, for trees fetched without them, e.g.
+    ?sub_questions=4,2&sub_sections=7. Only the id and solutions columns are
+    read, one query per kind. Results keep the requested order; ids that do
+    not exist are listed under missing.
+    """
+    try:
+        requested = {
+            key: parse_ids(request.args[key], MAX_IDS)
+            for key in SOLUTION_MODELS if request.args.get(key)
+        }
+        if not requested:
+            return jsonify({'error': f"One of {', '.join(SOLUTION_MODELS)} is required"}), 400
+        if sum(len(ids) for ids in requested.values()) > MAX_IDS:
+            raise ValueError(f"At most {MAX_IDS} ids per request")
+
+        result = {'missing': {}}
+        for key, ids in requested.items():
+            model = SOLUTION_MODELS[key]
+            found = dict(db.session.execute(
+                db.select(model.id, model.solutions).where(model.id.in_(ids))
+            ).all())
+            result[key] = [{'id': i, 'solutions': found[i]} for i in ids if i in found]
+            result['missing'][key] = [i for i in ids if i not in found]
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error fetching solutions {dict(request.args)}: {str(e)}")
+        return jsonify({'error': 'Database error'}), 500
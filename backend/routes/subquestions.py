@@ -1,11 +1,40 @@
 from flask import Blueprint, request, jsonify
-from models import db, Question, SubQuestion, SubSection
+from models import db, Question, SubQuestion, SubSection, count_by, bump_exam_version, append_children, next_sort_order, record_deletion
+from sqlalchemy.orm import selectinload
+from similarity import index_nodes, remove_tree, find_similar
+from projection import parse_fields, columns, text_of
+from bulk import batch_rows, is_int
+from utils import parse_ids
 import logging
 
 
 subquestions_bp = Blueprint('subquestions', __name__)
 logger = logging.getLogger(__name__)
 
+MAX_BATCH_SIZE = 500
+MAX_IDS = 100
+
+def subquestion_dict(subquestion):
+    """A subquestion with its subsections"""
+    # Get subsections
+    subsections = []
+    for ss in sorted(subquestion.sub_sections, key=lambda x: (x.sort_order or 0)):
+        subsec_data = {
+            'id': ss.id,
+            'stem': ss.stem,
+            'sort_order': ss.sort_order
+        }
+        subsections.append(subsec_data)
+
+    return {
+        'id': subquestion.id,
+        'question_id': subquestion.question_id,
+        'stem': subquestion.stem,
+        'sort_order': subquestion.sort_order,
+        'sub_sections': subsections,
+        'solutions': subquestion.solutions
+    }
+
 @subquestions_bp.route('/', methods=['POST'])
 def create_subquestion():
     """Create a new subquestion for a question"""
@@ -16,12 +45,11 @@ def create_subquestion():
         if not question_id:
             return jsonify({'error': 'question_id is required'}), 400
             
-        # Verify question exists
-        question = Question.query.get_or_404(question_id)
+        # Verify question exists, locking it so concurrent appends get distinct sort orders
+        question = Question.query.with_for_update().get_or_404(question_id)
         
         # Get next sort order
-        last_subq = SubQuestion.query.filter_by(question_id=question_id).order_by(SubQuestion.sort_order.desc()).first()
-        next_order = last_subq.sort_order + 1 if last_subq else 1
+        next_order = next_sort_order(SubQuestion, SubQuestion.question_id, question_id)
         
         subquestion = SubQuestion(
             question_id=question_id,
@@ -29,6 +57,9 @@ def create_subquestion():
             sort_order=data.get('sort_order', next_order)
         )
         db.session.add(subquestion)
+        db.session.flush()
+        index_nodes('sub_question', [(subquestion.id, subquestion.stem)])
+        bump_exam_version(question.exam_id)
         db.session.commit()
         
         return jsonify({
@@ -45,30 +76,87 @@ def create_subquestion():
         logger.error(f"Error creating subquestion: {str(e)}")
         return jsonify({'error': 'Database error'}), 500
 
+@subquestions_bp.route('/batch', methods=['POST'])
+def create_subquestions_batch():
+    """
+    Append many subquestions to a question in one transaction. Subquestions
+    without a sort_order are numbered after the question's last one, in order.
+    """
+    question_id = None
+    try:
+        data = request.json
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Body must be a JSON object'}), 400
+        question_id = data.get('question_id')
+        items = data.get('sub_questions')
+
+        if not question_id:
+            return jsonify({'error': 'question_id is required'}), 400
+        if not is_int(question_id):
+            return jsonify({'error': 'question_id must be an integer'}), 400
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'sub_questions must be a non-empty list'}), 400
+        if len(items) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'At most {MAX_BATCH_SIZE} subquestions per batch'}), 400
+        rows = batch_rows('sub_questions', SubQuestion, items, ('stem', 'solutions', 'sort_order'))
+        question = db.session.get(Question, question_id, with_for_update=True)
+        if question is None:
+            return jsonify({'error': 'Question not found'}), 404
+
+        subquestions = append_children(SubQuestion, SubQuestion.question_id, question_id, rows)
+        index_nodes('sub_question', [(sq['id'], sq['stem']) for sq in subquestions], replace=False)
+        bump_exam_version(question.exam_id)
+        question_number = f"Q{question.sort_order}"
+        db.session.commit()
+
+        return jsonify({
+            'question_id': question_id,
+            'ids': [sq['id'] for sq in subquestions],
+            'sub_questions': [{
+                'id': sq['id'],
+                'stem': sq['stem'],
+                'sort_order': sq['sort_order'],
+                'solutions': sq['solutions'],
+                'subquestion_number': f"{question_number}.{sq['sort_order']}"
+            } for sq in subquestions]
+        }), 201
+
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error creating subquestions for question {question_id}: {str(e)}")
+        return jsonify({'error': 'Database error'}), 500
+
+@subquestions_bp.route('/', methods=['GET'])
+def get_subquestions():
+    """
+    Get many subquestions with their subsections, e.g. ?ids=3,1,2, in two
+    queries whatever the number of ids. Results keep the requested order;
+    ids that do not exist are listed under missing.
+    """
+    try:
+        ids = parse_ids(request.args.get('ids'), MAX_IDS)
+        found = {sq.id: sq for sq in SubQuestion.query.options(
+            selectinload(SubQuestion.sub_sections)
+        ).filter(SubQuestion.id.in_(ids))}
+        return jsonify({
+            'sub_questions': [subquestion_dict(found[i]) for i in ids if i in found],
+            'missing': [i for i in ids if i not in found]
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error fetching subquestions {request.args.get('ids')}: {str(e)}")
+        return jsonify({'error': 'Database error'}), 500
+
 @subquestions_bp.route('/<int:subquestion_id>', methods=['GET'])
 def get_subquestion(subquestion_id):
     """Get a specific subquestion by ID"""
     try:
         subquestion = SubQuestion.query.get_or_404(subquestion_id)
-        
-        # Get subsections
-        subsections = []
-        for ss in sorted(subquestion.sub_sections, key=lambda x: (x.sort_order or 0)):
-            subsec_data = {
-                'id': ss.id,
-                'stem': ss.stem,
-                'sort_order': ss.sort_order
-            }
-            subsections.append(subsec_data)
-        
-        return jsonify({
-            'id': subquestion.id,
-            'question_id': subquestion.question_id,
-            'stem': subquestion.stem,
-            'sort_order': subquestion.sort_order,
-            'sub_sections': subsections,
-            'solutions': subquestion.solutions
-        })
+        return jsonify(subquestion_dict(subquestion))
         
     except Exception as e:
         logger.error(f"Error fetching subquestion {subquestion_id}: {str(e)}")
@@ -88,6 +176,9 @@ def update_subquestion(subquestion_id):
         if 'solutions' in data:
             subquestion.solutions = data['solutions']
             
+        if 'stem' in data:
+            index_nodes('sub_question', [(subquestion.id, subquestion.stem)])
+        bump_exam_version(subquestion.question.exam_id)
         db.session.commit()
         
         return jsonify({
@@ -108,6 +199,9 @@ def delete_subquestion(subquestion_id):
     """Delete a subquestion and all its subsections"""
     try:
         subquestion = SubQuestion.query.get_or_404(subquestion_id)
+        bump_exam_version(subquestion.question.exam_id)
+        remove_tree(SubQuestion.id, [subquestion.id])
+        record_deletion('sub_question', subquestion.id)
         db.session.delete(subquestion)
         db.session.commit()
         
@@ -120,18 +214,26 @@ def delete_subquestion(subquestion_id):
 
 @subquestions_bp.route('/by-question/<int:question_id>', methods=['GET'])
 def get_subquestions_by_question(question_id):
-    """Get all subquestions for a specific question"""
+    """Get all subquestions for a specific question, with ?fields=/?include= as for the full exam"""
     try:
-        question = Question.query.get_or_404(question_id)
+        fields = parse_fields(request.args)
+        Question.query.get_or_404(question_id)
+        counts = count_by(SubSection.sub_question_id, db.select(SubQuestion.id).where(SubQuestion.question_id == question_id))
+        rows = db.session.query(
+            SubQuestion, db.func.coalesce(counts.c.count, 0)
+        ).options(
+            columns(SubQuestion, fields, SubQuestion.question_id)
+        ).outerjoin(
+            counts, counts.c.parent_id == SubQuestion.id
+        ).filter(SubQuestion.question_id == question_id).order_by(SubQuestion.sort_order, SubQuestion.id).all()
         subquestions = []
 
-        for sq in sorted(question.sub_questions, key=lambda x: (x.sort_order or 0)):
+        for sq, sub_sections_count in rows:
             subq_data = {
                 'id': sq.id,
-                'stem': sq.stem,
+                **text_of(sq, fields),
                 'sort_order': sq.sort_order,
-                'solutions': sq.solutions,
-                'sub_sections_count': len(sq.sub_sections)
+                'sub_sections_count': sub_sections_count
             }
             subquestions.append(subq_data)
         
@@ -140,6 +242,24 @@ def get_subquestions_by_question(question_id):
             'subquestions': subquestions
         })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error fetching subquestions for question {question_id}: {str(e)}")
         return jsonify({'error': 'Database error'}), 500
+
+@subquestions_bp.route('/<int:subquestion_id>/similar', methods=['GET'])
+def get_similar_subquestions(subquestion_id):
+    """Near-duplicate subquestions and subsections from any paper, most similar first"""
+    try:
+        threshold = float(request.args.get('threshold', 0.6))
+        limit = min(int(request.args.get('limit', 20)), 100)
+        return jsonify({
+            'sub_question_id': subquestion_id,
+            'similar': find_similar('sub_question', subquestion_id, threshold, limit)
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error finding questions similar to subquestion {subquestion_id}: {str(e)}")
+        return jsonify({'error': 'Database error'}), 500
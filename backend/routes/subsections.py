@@ -1,11 +1,26 @@
 from flask import Blueprint, request, jsonify
-from models import db, SubQuestion, SubSection
+from models import db, SubQuestion, SubSection, bump_exam_version, append_children, next_sort_order, record_deletion
+from similarity import index_nodes, remove_nodes, find_similar
+from bulk import batch_rows, is_int
+from utils import parse_ids
 import logging
 
 
 subsections_bp = Blueprint('subsections', __name__)
 logger = logging.getLogger(__name__)
 
+MAX_BATCH_SIZE = 500
+MAX_IDS = 100
+
+def subsection_dict(subsection):
+    return {
+        'id': subsection.id,
+        'sub_question_id': subsection.sub_question_id,
+        'stem': subsection.stem,
+        'sort_order': subsection.sort_order,
+        'solutions': subsection.solutions
+    }
+
 @subsections_bp.route('/', methods=['POST'])
 def create_subsection():
     """Create a new subsection for a subquestion"""
@@ -19,12 +34,11 @@ def create_subsection():
         if not data.get('stem'):
             return jsonify({'error': 'stem is required'}), 400
         
-        # Verify subquestion exists
-        subquestion = SubQuestion.query.get_or_404(subquestion_id)
+        # Verify subquestion exists, locking it so concurrent appends get distinct sort orders
+        subquestion = SubQuestion.query.with_for_update().get_or_404(subquestion_id)
         
         # Get next sort order
-        last_subsec = SubSection.query.filter_by(sub_question_id=subquestion_id).order_by(SubSection.sort_order.desc()).first()
-        next_order = last_subsec.sort_order + 1 if last_subsec else 1
+        next_order = next_sort_order(SubSection, SubSection.sub_question_id, subquestion_id)
         
         subsection = SubSection(
             sub_question_id=subquestion_id,
@@ -33,6 +47,9 @@ def create_subsection():
             solutions=data['solutions']
         )
         db.session.add(subsection)
+        db.session.flush()
+        index_nodes('sub_section', [(subsection.id, subsection.stem)])
+        bump_exam_version(subquestion.question.exam_id)
         db.session.commit()
         
         return jsonify({
@@ -53,19 +70,86 @@ def create_subsection():
         logger.error(f"Error creating subsection: {str(e)}")
         return jsonify({'error': 'Database error'}), 500
 
+@subsections_bp.route('/batch', methods=['POST'])
+def create_subsections_batch():
+    """
+    Append many subsections to a subquestion in one transaction. Subsections
+    without a sort_order are numbered after the subquestion's last one, in order.
+    """
+    subquestion_id = None
+    try:
+        data = request.json
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Body must be a JSON object'}), 400
+        subquestion_id = data.get('sub_question_id')
+        items = data.get('sub_sections')
+
+        if not subquestion_id:
+            return jsonify({'error': 'sub_question_id is required'}), 400
+        if not is_int(subquestion_id):
+            return jsonify({'error': 'sub_question_id must be an integer'}), 400
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'sub_sections must be a non-empty list'}), 400
+        if len(items) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'At most {MAX_BATCH_SIZE} subsections per batch'}), 400
+        rows = batch_rows('sub_sections', SubSection, items, ('stem', 'solutions', 'sort_order'))
+        if not all(row['stem'] for row in rows):
+            return jsonify({'error': 'stem is required'}), 400
+        subquestion = db.session.get(SubQuestion, subquestion_id, with_for_update=True)
+        if subquestion is None:
+            return jsonify({'error': 'Subquestion not found'}), 404
+
+        subsections = append_children(SubSection, SubSection.sub_question_id, subquestion_id, rows)
+        index_nodes('sub_section', [(ss['id'], ss['stem']) for ss in subsections], replace=False)
+        bump_exam_version(subquestion.question.exam_id)
+        prefix = f"Q{subquestion.question.sort_order}.{subquestion.sort_order}"
+        db.session.commit()
+
+        return jsonify({
+            'sub_question_id': subquestion_id,
+            'ids': [ss['id'] for ss in subsections],
+            'sub_sections': [{
+                'id': ss['id'],
+                'stem': ss['stem'],
+                'sort_order': ss['sort_order'],
+                'solutions': ss['solutions'],
+                'subsection_number': f"{prefix}.{ss['sort_order']}"
+            } for ss in subsections]
+        }), 201
+
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error creating subsections for subquestion {subquestion_id}: {str(e)}")
+        return jsonify({'error': 'Database error'}), 500
+
+@subsections_bp.route('/', methods=['GET'])
+def get_subsections():
+    """
+    Get many subsections in one query, e.g. ?ids=3,1,2. Results keep the
+    requested order; ids that do not exist are listed under missing.
+    """
+    try:
+        ids = parse_ids(request.args.get('ids'), MAX_IDS)
+        found = {ss.id: ss for ss in SubSection.query.filter(SubSection.id.in_(ids))}
+        return jsonify({
+            'sub_sections': [subsection_dict(found[i]) for i in ids if i in found],
+            'missing': [i for i in ids if i not in found]
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error fetching subsections {request.args.get('ids')}: {str(e)}")
+        return jsonify({'error': 'Database error'}), 500
+
 @subsections_bp.route('/<int:subsection_id>', methods=['GET'])
 def get_subsection(subsection_id):
     """Get a specific subsection by ID"""
     try:
         subsection = SubSection.query.get_or_404(subsection_id)
-        
-        return jsonify({
-            'id': subsection.id,
-            'sub_question_id': subsection.sub_question_id,
-            'stem': subsection.stem,
-            'sort_order': subsection.sort_order,
-            'solutions': subsection.solutions
-        })
+        return jsonify(subsection_dict(subsection))
         
     except Exception as e:
         logger.error(f"Error fetching subsection {subsection_id}: {str(e)}")
@@ -85,6 +169,9 @@ def update_subsection(subsection_id):
         if 'solutions' in data:
             subsection.solutions = data['solutions']
 
+        if 'stem' in data:
+            index_nodes('sub_section', [(subsection.id, subsection.stem)])
+        bump_exam_version(subsection.sub_question.question.exam_id)
         db.session.commit()
         
         return jsonify({
@@ -105,6 +192,9 @@ def delete_subsection(subsection_id):
     """Delete a subsection"""
     try:
         subsection = SubSection.query.get_or_404(subsection_id)
+        bump_exam_version(subsection.sub_question.question.exam_id)
+        remove_nodes('sub_section', [subsection.id])
+        record_deletion('sub_section', subsection.id)
         db.session.delete(subsection)
         db.session.commit()
         
@@ -139,3 +229,19 @@ def get_subsections_by_subquestion(subquestion_id):
     except Exception as e:
         logger.error(f"Error fetching subsections for subquestion {subquestion_id}: {str(e)}")
         return jsonify({'error': 'Database error'}), 500
+
+@subsections_bp.route('/<int:subsection_id>/similar', methods=['GET'])
+def get_similar_subsections(subsection_id):
+    """Near-duplicate subquestions and subsections from any paper, most similar first"""
+    try:
+        threshold = float(request.args.get('threshold', 0.6))
+        limit = min(int(request.args.get('limit', 20)), 100)
+        return jsonify({
+            'sub_section_id': subsection_id,
+            'similar': find_similar('sub_section', subsection_id, threshold, limit)
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error finding questions similar to subsection {subsection_id}: {str(e)}")
+        return jsonify({'error': 'Database error'}), 500
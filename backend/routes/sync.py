@@ -0,0 +1,36 @@
+from flask import Blueprint, current_app, request, jsonify
+from projection import parse_fields
+from sync import changes_since
+import logging
+
+
+sync_bp = Blueprint('sync', __name__)
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 2000
+
+@sync_bp.route('/', methods=['GET'])
+def sync():
+    """
+    Exams, questions, subquestions and subsections changed since
+    ?since=<sync_token>, and tombstones of deleted ones; the whole bank
+    without a token. Follow sync_token while has_more is true, then keep the
+    last sync_token for the next sync. Supports ?fields=/?include=.
+    """
+    try:
+        limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        changes, token, has_more = changes_since(
+            request.args.get('since'),
+            limit,
+            parse_fields(request.args),
+            current_app.config['SYNC_OVERLAP_SECONDS']
+        )
+        return jsonify(dict(changes, sync_token=token, has_more=has_more))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error syncing since {request.args.get('since')}: {str(e)}")
+        return jsonify({'error': 'Database error'}), 500
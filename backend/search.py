@@ -0,0 +1,175 @@
+import re
+from sqlalchemy import text
+from database import db
+from models import Exam, Question, SubQuestion, SubSection
+
+_TOKEN = re.compile(r'\w+')
+
+# FTS5 rowids pack the node type into the low bits so index maintenance is a
+# rowid lookup rather than a scan: rowid = node_id * 4 + kind
+KINDS = {1: 'question', 2: 'sub_question', 3: 'sub_section'}
+
+_SQLITE_EXAM_ID = {
+    'question': 'NEW.exam_id',
+    'sub_question': '(SELECT exam_id FROM question WHERE id = NEW.question_id)',
+    'sub_section': (
+        '(SELECT q.exam_id FROM sub_question sq JOIN question q ON q.id = sq.question_id'
+        ' WHERE sq.id = NEW.sub_question_id)'
+    ),
+}
+
+# Engines whose search index is known to exist, so each process checks once
+_indexed_engines = set()
+
+def create_search_index():
+    """
+    Sets up the SQLite FTS5 index and the triggers that keep it in step with
+    every write, including bulk inserts. MySQL uses the FULLTEXT indexes
+    declared on the models and needs nothing here. Run by flask init-db, and
+    by the first search of a process if init-db has not run since.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return
+    with db.engine.begin() as conn:
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'"
+        )).first()
+        if exists:
+            return
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE search_index USING fts5("
+            "stem, solutions, exam_id UNINDEXED, tokenize = 'porter unicode61')"
+        ))
+        for code, kind in KINDS.items():
+            solutions = 'NULL' if kind == 'question' else 'NEW.solutions'
+            insert = (
+                f"INSERT INTO search_index (rowid, stem, solutions, exam_id) "
+                f"VALUES (NEW.id * 4 + {code}, NEW.stem, {solutions}, {_SQLITE_EXAM_ID[kind]});"
+            )
+            delete = f"DELETE FROM search_index WHERE rowid = OLD.id * 4 + {code};"
+            conn.execute(text(f"CREATE TRIGGER {kind}_search_ai AFTER INSERT ON {kind} BEGIN {insert} END"))
+            conn.execute(text(f"CREATE TRIGGER {kind}_search_au AFTER UPDATE ON {kind} BEGIN {delete} {insert} END"))
+            conn.execute(text(f"CREATE TRIGGER {kind}_search_ad AFTER DELETE ON {kind} BEGIN {delete} END"))
+
+        # Backfill whatever was written before the index existed
+        for code, kind in KINDS.items():
+            solutions = 'NULL' if kind == 'question' else 'NEW.solutions'
+            select = (
+                f"SELECT NEW.id * 4 + {code}, NEW.stem, {solutions}, {_SQLITE_EXAM_ID[kind]} FROM {kind} AS NEW"
+            )
+            conn.execute(text(f"INSERT INTO search_index (rowid, stem, solutions, exam_id) {select}"))
+
+def search_nodes(query, subject=None, year=None, limit=20, offset=0):
+    """
+    Ranked full-text search over question, sub-question and sub-section
+    stems and solutions. Returns (hits, has_more); each hit is a dict with
+    its type, ids, stem, exam subject/year and relevance score.
+    """
+    tokens = _TOKEN.findall(query)
+    if not tokens:
+        return [], False
+    ensure_search_index()
+
+    filters = ''
+    params = {'limit': limit + 1, 'offset': offset}
+    if subject:
+        filters += ' AND e.subject = :subject'
+        params['subject'] = subject
+    if year:
+        filters += ' AND e.year = :year'
+        params['year'] = year
+
+    if db.engine.dialect.name == 'sqlite':
+        ranked = _sqlite_matches(tokens, filters, params)
+    elif db.engine.dialect.name == 'mysql':
+        ranked = _mysql_matches(' '.join(tokens), filters, params)
+    else:
+        raise NotImplementedError(f"Search is not supported on {db.engine.dialect.name}")
+
+    has_more = len(ranked) > limit
+    ranked = ranked[:limit]
+    return _hydrate(ranked), has_more
+
+def ensure_search_index():
+    """
+    Creates the index on first use in this process when it is missing, e.g.
+    a database created before search existed and not upgraded with init-db.
+    Creation backfills every existing row, so writes made before are found.
+    """
+    engine = db.engine
+    if engine not in _indexed_engines:
+        create_search_index()
+        _indexed_engines.add(engine)
+
+def _sqlite_matches(tokens, filters, params):
+    # Quote every token so user input can never be read as FTS5 syntax
+    params['q'] = ' '.join(f'"{token}"' for token in tokens)
+    rows = db.session.execute(text(
+        "SELECT search_index.rowid, bm25(search_index) AS rank FROM search_index "
+        "JOIN exam e ON e.id = search_index.exam_id "
+        f"WHERE search_index MATCH :q{filters} "
+        "ORDER BY rank LIMIT :limit OFFSET :offset"
+    ), params).all()
+    # bm25 is lower-is-better, flip it so higher scores rank first everywhere
+    return [(KINDS[rowid % 4], rowid // 4, -rank) for rowid, rank in rows]
+
+def _mysql_matches(query, filters, params):
+    params['q'] = query
+    against = "AGAINST (:q IN NATURAL LANGUAGE MODE)"
+    rows = db.session.execute(text(
+        f"SELECT 'question' AS kind, q.id AS node_id, MATCH (q.stem) {against} AS score "
+        "FROM question q JOIN exam e ON e.id = q.exam_id "
+        f"WHERE MATCH (q.stem) {against}{filters} "
+        "UNION ALL "
+        f"SELECT 'sub_question', sq.id, MATCH (sq.stem, sq.solutions) {against} "
+        "FROM sub_question sq JOIN question q ON q.id = sq.question_id JOIN exam e ON e.id = q.exam_id "
+        f"WHERE MATCH (sq.stem, sq.solutions) {against}{filters} "
+        "UNION ALL "
+        f"SELECT 'sub_section', ss.id, MATCH (ss.stem, ss.solutions) {against} "
+        "FROM sub_section ss JOIN sub_question sq ON sq.id = ss.sub_question_id "
+        "JOIN question q ON q.id = sq.question_id JOIN exam e ON e.id = q.exam_id "
+        f"WHERE MATCH (ss.stem, ss.solutions) {against}{filters} "
+        "ORDER BY score DESC LIMIT :limit OFFSET :offset"
+    ), params).all()
+    return [(kind, node_id, float(score)) for kind, node_id, score in rows]
+
+def _hydrate(ranked):
+    """Loads the matched nodes for one page, one query per node type"""
+    ids = {kind: [node_id for k, node_id, _ in ranked if k == kind] for kind in KINDS.values()}
+    nodes = {}
+
+    if ids['question']:
+        for row in db.session.query(
+            Question.id, Question.stem, Question.exam_id, Exam.subject, Exam.year
+        ).join(Exam, Exam.id == Question.exam_id).filter(Question.id.in_(ids['question'])):
+            nodes['question', row.id] = {
+                'stem': row.stem, 'exam_id': row.exam_id, 'subject': row.subject, 'year': row.year
+            }
+
+    if ids['sub_question']:
+        for row in db.session.query(
+            SubQuestion.id, SubQuestion.stem, SubQuestion.question_id, Question.exam_id, Exam.subject, Exam.year
+        ).join(Question, Question.id == SubQuestion.question_id).join(
+            Exam, Exam.id == Question.exam_id
+        ).filter(SubQuestion.id.in_(ids['sub_question'])):
+            nodes['sub_question', row.id] = {
+                'stem': row.stem, 'question_id': row.question_id, 'exam_id': row.exam_id,
+                'subject': row.subject, 'year': row.year
+            }
+
+    if ids['sub_section']:
+        for row in db.session.query(
+            SubSection.id, SubSection.stem, SubSection.sub_question_id, SubQuestion.question_id,
+            Question.exam_id, Exam.subject, Exam.year
+        ).join(SubQuestion, SubQuestion.id == SubSection.sub_question_id).join(
+            Question, Question.id == SubQuestion.question_id
+        ).join(Exam, Exam.id == Question.exam_id).filter(SubSection.id.in_(ids['sub_section'])):
+            nodes['sub_section', row.id] = {
+                'stem': row.stem, 'sub_question_id': row.sub_question_id, 'question_id': row.question_id,
+                'exam_id': row.exam_id, 'subject': row.subject, 'year': row.year
+            }
+
+    return [
+        dict(nodes[kind, node_id], type=kind, id=node_id, score=score)
+        for kind, node_id, score in ranked if (kind, node_id) in nodes
+    ]
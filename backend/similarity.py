@@ -0,0 +1,293 @@
+import logging
+import random
+import re
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+from database import db
+from models import Exam, Question, SubQuestion, SubSection, SimilaritySignature, SimilarityBucket, SimilarityPending
+
+logger = logging.getLogger(__name__)
+
+# 12 bands of 4 rows: pairs at 0.6 Jaccard similarity share a band about 80%
+# of the time and pairs at 0.8 almost always, and the estimate from the full
+# signature is then checked against the caller's threshold
+NUM_PERM = 48
+BANDS = 12
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+# Queued exams indexed per transaction by index_pending
+PENDING_BATCH_SIZE = 20
+
+# Multiply-shift hashing keeps every product within 128 bits, which is much
+# cheaper in pure Python than reducing modulo a large prime
+_MASK = (1 << 64) - 1
+_rng = random.Random(1729)
+_PERMUTATIONS = [(_rng.getrandbits(64) | 1, _rng.getrandbits(64)) for _ in range(NUM_PERM)]
+_SIGNATURE = struct.Struct(f'>{NUM_PERM}I')
+_WORD = re.compile(r'\w+')
+
+NODE_MODELS = {'sub_question': SubQuestion, 'sub_section': SubSection}
+
+def shingles(text):
+    """Word 3-grams of the lower-cased text, or its words when it is shorter"""
+    words = _WORD.findall((text or '').lower())
+    if len(words) < SHINGLE_SIZE:
+        return set(words)
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def minhash(text):
+    """MinHash signature as a tuple of NUM_PERM ints, or None for empty text"""
+    hashes = [zlib.crc32(s.encode()) for s in shingles(text)]
+    if not hashes:
+        return None
+    # One pass per shingle and a column-wise min is cheaper than one pass
+    # per permutation, stems being short
+    return tuple(map(min, zip(*[
+        [((a * h + b) & _MASK) >> 32 for a, b in _PERMUTATIONS]
+        for h in hashes
+    ])))
+
+def band_buckets(signature):
+    """(band, bucket) pairs for the LSH index, bucket being a CRC of the band's rows"""
+    packed = _SIGNATURE.pack(*signature)
+    width = ROWS * 4
+    return [
+        (band, zlib.crc32(packed[band * width:(band + 1) * width]))
+        for band in range(BANDS)
+    ]
+
+def estimate_similarity(a, b):
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+def index_nodes(node_type, rows, replace=True):
+    """
+    Adds (id, stem) rows of one node type to the index. replace=False skips
+    clearing old entries, for nodes that were only just created. Nodes with
+    an empty stem end up with no entries.
+    """
+    rows = list(rows)
+    signatures = []
+    buckets = []
+    for node_id, stem in rows:
+        signature = minhash(stem)
+        if signature is None:
+            continue
+        signatures.append({'node_type': node_type, 'node_id': node_id, 'signature': _SIGNATURE.pack(*signature)})
+        buckets.extend(
+            {'node_type': node_type, 'node_id': node_id, 'band': band, 'bucket': bucket}
+            for band, bucket in band_buckets(signature)
+        )
+    if replace and rows:
+        remove_nodes(node_type, [node_id for node_id, _ in rows])
+    if signatures:
+        db.session.execute(SimilaritySignature.__table__.insert(), signatures)
+        db.session.execute(SimilarityBucket.__table__.insert(), buckets)
+
+def remove_nodes(node_type, node_ids):
+    """Drops the entries of the given ids (a list or a SELECT of ids) of one node type"""
+    SimilaritySignature.query.filter(
+        SimilaritySignature.node_type == node_type, SimilaritySignature.node_id.in_(node_ids)
+    ).delete(synchronize_session=False)
+    SimilarityBucket.query.filter(
+        SimilarityBucket.node_type == node_type, SimilarityBucket.node_id.in_(node_ids)
+    ).delete(synchronize_session=False)
+
+def remove_tree(parent_column, parent_ids):
+    """
+    Drops the entries of every indexed node under the given exams, questions
+    or sub-questions, parent_column being Question.exam_id,
+    SubQuestion.question_id or SubQuestion.id. Called before deleting the
+    parents, as the database cascade cannot reach the index tables.
+    """
+    sub_question_ids = db.select(SubQuestion.id).where(parent_column.in_(parent_ids))
+    if parent_column is Question.exam_id:
+        sub_question_ids = sub_question_ids.join(Question, Question.id == SubQuestion.question_id)
+    remove_nodes('sub_question', sub_question_ids)
+    remove_nodes('sub_section', db.select(SubSection.id).where(SubSection.sub_question_id.in_(sub_question_ids)))
+    if parent_column is Question.exam_id:
+        db.session.execute(db.delete(SimilarityPending).where(SimilarityPending.exam_id.in_(parent_ids)))
+
+def index_exams(exam_ids, replace=True):
+    """Indexes every sub-question and sub-section stem of the given exams"""
+    if replace:
+        remove_tree(Question.exam_id, exam_ids)
+    index_nodes('sub_question', db.session.query(SubQuestion.id, SubQuestion.stem).join(
+        Question, Question.id == SubQuestion.question_id
+    ).filter(Question.exam_id.in_(exam_ids)).all(), replace=False)
+    index_nodes('sub_section', db.session.query(SubSection.id, SubSection.stem).join(
+        SubQuestion, SubQuestion.id == SubSection.sub_question_id
+    ).join(Question, Question.id == SubQuestion.question_id).filter(Question.exam_id.in_(exam_ids)).all(), replace=False)
+
+def queue_exam(exam_id):
+    """
+    Queues a new exam for index_pending in the caller's transaction. Bulk
+    inserts queue instead of indexing, which would cost several times the
+    insert itself; the queue is drained after the request (see
+    init_similarity) or at the end of an import command. An exam id can
+    still be queued when a deleted exam's id was reused.
+    """
+    if db.session.get(SimilarityPending, exam_id) is None:
+        db.session.execute(SimilarityPending.__table__.insert(), {'exam_id': exam_id})
+    db.session.info['similarity_queued'] = True
+
+def index_pending(batch_size=PENDING_BATCH_SIZE):
+    """
+    Indexes queued exams batch_size at a time, one transaction per batch,
+    until the queue is empty; returns the number of exams taken off it.
+    Rows locked by another drainer are skipped where the database can.
+    """
+    total = 0
+    while True:
+        exam_ids = db.session.scalars(
+            db.select(SimilarityPending.exam_id).order_by(SimilarityPending.exam_id)
+            .limit(batch_size).with_for_update(skip_locked=True)
+        ).all()
+        if not exam_ids:
+            return total
+        # Exams deleted since they were queued have no nodes left to index
+        index_exams(exam_ids)
+        db.session.execute(db.delete(SimilarityPending).where(SimilarityPending.exam_id.in_(exam_ids)))
+        db.session.commit()
+        total += len(exam_ids)
+
+class PendingIndexer:
+    """
+    Runs index_pending on a single background thread. A wake while a drain
+    is running queues one more, so exams committed during a drain are not
+    left behind, and further wakes coalesce into that one.
+    """
+    def __init__(self):
+        self._executor = None
+        self._pending = None
+        self._lock = threading.Lock()
+
+    def wake(self, app):
+        """Schedules a drain unless one is already waiting to start; returns its future"""
+        with self._lock:
+            if self._executor is None:
+                # Created on first use, so a preloading master never starts the thread
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='similarity')
+            if self._pending is None or self._pending.running() or self._pending.done():
+                self._pending = self._executor.submit(_drain, app)
+            return self._pending
+
+def _drain(app):
+    with app.app_context():
+        try:
+            return index_pending()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error indexing queued exams: {str(e)}")
+            return 0
+
+pending_indexer = PendingIndexer()
+
+def init_similarity(app):
+    app.teardown_request(_wake_indexer)
+
+def _wake_indexer(exc):
+    # Runs after the response, so the drain sees what the request committed
+    if not db.session.info.pop('similarity_queued', False):
+        return
+    if db.engine.url.database in (None, '', ':memory:'):
+        # An in-memory SQLite database is one connection shared by all threads
+        _drain(current_app._get_current_object())
+    else:
+        pending_indexer.wake(current_app._get_current_object())
+
+def rebuild_index(batch_size=1000):
+    """Recomputes the whole index from the node tables, batch_size rows at a time"""
+    SimilarityBucket.query.delete()
+    SimilaritySignature.query.delete()
+    SimilarityPending.query.delete()
+    total = 0
+    for node_type, model in NODE_MODELS.items():
+        last_id = 0
+        while True:
+            rows = db.session.query(model.id, model.stem).filter(
+                model.id > last_id
+            ).order_by(model.id).limit(batch_size).all()
+            if not rows:
+                break
+            index_nodes(node_type, rows, replace=False)
+            db.session.commit()
+            last_id = rows[-1][0]
+            total += len(rows)
+    return total
+
+def find_similar(node_type, node_id, threshold=0.6, limit=20):
+    """
+    Nodes whose stems are near-duplicates of the given one, best first.
+    Only nodes sharing an LSH bucket are compared, so the cost depends on
+    the number of candidates rather than the size of the bank.
+    """
+    stored = db.session.get(SimilaritySignature, (node_type, node_id))
+    if stored is not None:
+        signature = _SIGNATURE.unpack(stored.signature)
+    else:
+        node = db.session.get(NODE_MODELS[node_type], node_id)
+        signature = minhash(node.stem) if node else None
+    if signature is None or limit < 1:
+        return []
+
+    candidates = db.session.query(SimilarityBucket.node_type, SimilarityBucket.node_id).filter(
+        db.or_(*[
+            db.and_(SimilarityBucket.band == band, SimilarityBucket.bucket == bucket)
+            for band, bucket in band_buckets(signature)
+        ])
+    ).distinct().all()
+    candidates = [c for c in candidates if tuple(c) != (node_type, node_id)]
+    if not candidates:
+        return []
+
+    scored = []
+    for kind in NODE_MODELS:
+        ids = [cid for ctype, cid in candidates if ctype == kind]
+        if not ids:
+            continue
+        for row in SimilaritySignature.query.filter(
+            SimilaritySignature.node_type == kind, SimilaritySignature.node_id.in_(ids)
+        ):
+            score = estimate_similarity(signature, _SIGNATURE.unpack(row.signature))
+            if score >= threshold:
+                scored.append((score, kind, row.node_id))
+    scored.sort(key=lambda s: (-s[0], s[1], s[2]))
+
+    # Hydrate a limit's worth at a time, topping up when some were left out
+    similar = []
+    for start in range(0, len(scored), limit):
+        similar.extend(_hydrate(scored[start:start + limit]))
+        if len(similar) >= limit:
+            break
+    return similar[:limit]
+
+def _hydrate(scored):
+    nodes = {}
+    ids = {kind: [node_id for _, k, node_id in scored if k == kind] for kind in NODE_MODELS}
+    if ids['sub_question']:
+        for row in db.session.query(
+            SubQuestion.id, SubQuestion.stem, SubQuestion.question_id, Exam.id.label('exam_id'),
+            Exam.subject, Exam.year, Exam.province, Exam.month
+        ).join(Question, Question.id == SubQuestion.question_id).join(
+            Exam, Exam.id == Question.exam_id
+        ).filter(SubQuestion.id.in_(ids['sub_question'])):
+            nodes['sub_question', row.id] = dict(row._mapping)
+    if ids['sub_section']:
+        for row in db.session.query(
+            SubSection.id, SubSection.stem, SubSection.sub_question_id, Exam.id.label('exam_id'),
+            Exam.subject, Exam.year, Exam.province, Exam.month
+        ).join(SubQuestion, SubQuestion.id == SubSection.sub_question_id).join(
+            Question, Question.id == SubQuestion.question_id
+        ).join(Exam, Exam.id == Question.exam_id).filter(SubSection.id.in_(ids['sub_section'])):
+            nodes['sub_section', row.id] = dict(row._mapping)
+
+    # Deletes drop their nodes' index rows, but a node deleted between the
+    # candidate lookup and here must still be left out
+    return [
+        dict(nodes[kind, node_id], type=kind, similarity=score)
+        for score, kind, node_id in scored if (kind, node_id) in nodes
+    ]
@@ -0,0 +1,134 @@
+from functools import partial
+from itertools import chain, groupby
+from operator import attrgetter
+from flask import current_app, request
+from models import db, Question, SubQuestion, SubSection
+
+STREAM_MIMETYPE = 'application/stream+json'
+CHUNK_SIZE = 8192
+
+def wants_stream():
+    """Clients opt into streamed trees with ?stream=1 or Accept: application/stream+json"""
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return request.accept_mimetypes.best == STREAM_MIMETYPE
+
+def stream_exam_tree(exam):
+    """
+    Yields the same JSON document as the buffered /full endpoint, built from a
+    single flat ordered query that is consumed as rows come off the cursor.
+    Only the current row and one output chunk are held in memory.
+    """
+    dumps = _compact_dumps()
+    rows = db.session.query(
+        Question.id.label('q_id'),
+        Question.stem.label('q_stem'),
+        Question.sort_order.label('q_sort_order'),
+        *_subquestion_columns()
+    ).outerjoin(
+        SubQuestion, SubQuestion.question_id == Question.id
+    ).outerjoin(
+        SubSection, SubSection.sub_question_id == SubQuestion.id
+    ).filter(
+        Question.exam_id == exam.id
+    ).order_by(
+        Question.sort_order, Question.id, *_subquestion_order()
+    ).execution_options(yield_per=500)
+
+    def chunks():
+        # Keys are emitted in sorted order to match jsonify's compact output
+        yield (
+            f'{{"id":{dumps(exam.id)},"month":{dumps(exam.month)},'
+            f'"province":{dumps(exam.province)},"questions":['
+        )
+        for i, (_, q_rows) in enumerate(groupby(rows, key=attrgetter('q_id'))):
+            first = next(q_rows)
+            yield (
+                f'{"," if i else ""}{{"id":{dumps(first.q_id)},"sort_order":{dumps(first.q_sort_order)},'
+                f'"stem":{dumps(first.q_stem)},"sub_questions":['
+            )
+            yield from _subquestion_chunks(chain([first], q_rows), dumps)
+            yield ']}'
+        yield f'],"subject":{dumps(exam.subject)},"year":{dumps(exam.year)}}}\n'
+
+    return _buffered(chunks())
+
+def stream_question_tree(question):
+    """Streaming counterpart of GET /api/questions/<id>, same shape and key order"""
+    dumps = _compact_dumps()
+    rows = db.session.query(
+        *_subquestion_columns()
+    ).outerjoin(
+        SubSection, SubSection.sub_question_id == SubQuestion.id
+    ).filter(
+        SubQuestion.question_id == question.id
+    ).order_by(
+        *_subquestion_order()
+    ).execution_options(yield_per=500)
+
+    def chunks():
+        yield (
+            f'{{"exam_id":{dumps(question.exam_id)},"id":{dumps(question.id)},'
+            f'"sort_order":{dumps(question.sort_order)},"stem":{dumps(question.stem)},'
+            f'"sub_questions":['
+        )
+        yield from _subquestion_chunks(rows, dumps)
+        yield ']}\n'
+
+    return _buffered(chunks())
+
+def _compact_dumps():
+    return partial(current_app.json.dumps, separators=(',', ':'))
+
+def _subquestion_columns():
+    return (
+        SubQuestion.id.label('sq_id'),
+        SubQuestion.stem.label('sq_stem'),
+        SubQuestion.sort_order.label('sq_sort_order'),
+        SubQuestion.solutions.label('sq_solutions'),
+        SubSection.id.label('ss_id'),
+        SubSection.stem.label('ss_stem'),
+        SubSection.sort_order.label('ss_sort_order'),
+        SubSection.solutions.label('ss_solutions')
+    )
+
+def _subquestion_order():
+    return (SubQuestion.sort_order, SubQuestion.id, SubSection.sort_order, SubSection.id)
+
+def _subquestion_chunks(rows, dumps):
+    """JSON for the sub-questions of one question; rows are grouped by sq_id"""
+    emitted = False
+    for sq_id, sq_rows in groupby(rows, key=attrgetter('sq_id')):
+        # A question without sub-questions still yields one outer-joined row
+        if sq_id is None:
+            continue
+        first = next(sq_rows)
+        yield (
+            f'{"," if emitted else ""}{{"id":{dumps(first.sq_id)},"solutions":{dumps(first.sq_solutions)},'
+            f'"sort_order":{dumps(first.sq_sort_order)},"stem":{dumps(first.sq_stem)},"sub_sections":['
+        )
+        emitted = True
+        yield ','.join(
+            dumps({
+                'id': row.ss_id,
+                'stem': row.ss_stem,
+                'solutions': row.ss_solutions,
+                'sort_order': row.ss_sort_order
+            })
+            for row in chain([first], sq_rows) if row.ss_id is not None
+        )
+        yield ']}'
+
+def _buffered(chunks):
+    """Coalesces small fragments so each write to the client is about CHUNK_SIZE"""
+    buffer = []
+    size = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
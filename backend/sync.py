@@ -0,0 +1,120 @@
+"""
+Delta sync for clients that keep the bank offline. A sync returns every
+exam and node changed since the client's last sync token, plus tombstones
+of deleted ones, one kind at a time in (updated_at, id) order so that each
+page is a range scan of that table's updated_at index.
+"""
+import base64
+import json
+from datetime import datetime, timedelta
+from models import db, utcnow, Exam, Question, SubQuestion, SubSection, Tombstone
+from projection import columns, text_of
+
+# Deletions go first, so applying a page in order never drops a row that
+# was re-created after its tombstone
+SYNC_KINDS = ('deleted', 'exams', 'questions', 'sub_questions', 'sub_sections')
+
+def encode_token(since=None, until=None, kind=0, after=None):
+    """
+    Opaque token. Without until it starts the next sync; with until it is a
+    page cursor inside the sync that fixed until on its first page.
+    """
+    state = {
+        'since': since.isoformat() if since else None,
+        'until': until.isoformat() if until else None,
+        'kind': kind,
+        'after': [after[0].isoformat(), after[1]] if after else None
+    }
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(',', ':')).encode()).decode()
+
+def decode_token(token):
+    """Inverse of encode_token, raises ValueError on a malformed token"""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token.encode()))
+        since = datetime.fromisoformat(state['since']) if state['since'] else None
+        until = datetime.fromisoformat(state['until']) if state['until'] else None
+        after = (datetime.fromisoformat(state['after'][0]), int(state['after'][1])) if state['after'] else None
+        kind = int(state['kind'])
+        if not 0 <= kind < len(SYNC_KINDS):
+            raise ValueError(kind)
+        return since, until, kind, after
+    except Exception:
+        raise ValueError(f"Invalid sync token: {token}")
+
+def changes_since(token, limit, fields, overlap_seconds):
+    """
+    One page of changes: (changes by kind, next token, has_more). While
+    has_more is true the token fetches the next page; after the last page
+    it is the token to store for the next sync. The next sync starts
+    overlap_seconds before this one's snapshot, so rows written by slow
+    transactions or not yet on a lagging replica are picked up then.
+    """
+    since, until, kind, after = decode_token(token) if token else (None, None, 0, None)
+    until = until or utcnow()
+    if since is None and kind == 0:
+        # A first sync has nothing to delete
+        kind = 1
+
+    changes = {name: [] for name in SYNC_KINDS}
+    while kind < len(SYNC_KINDS) and limit > 0:
+        name = SYNC_KINDS[kind]
+        rows = _changed_rows(name, since, until, after, limit + 1, fields)
+        changes[name] = [_row_dict(name, row, fields) for row in rows[:limit]]
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            return changes, encode_token(since, until, kind, (_stamp_of(last), last.id)), True
+        limit -= len(rows)
+        kind += 1
+        after = None
+
+    if kind < len(SYNC_KINDS):
+        return changes, encode_token(since, until, kind), True
+    return changes, encode_token(since=until - timedelta(seconds=overlap_seconds)), False
+
+def _changed_rows(name, since, until, after, limit, fields):
+    model, stamp, options = _source(name, fields)
+    query = db.select(model).options(*options).where(stamp <= until)
+    if since is not None:
+        query = query.where(stamp >= since)
+    if after is not None:
+        query = query.where(stamp >= after[0], db.or_(
+            stamp > after[0],
+            model.id > after[1]
+        ))
+    return db.session.scalars(query.order_by(stamp, model.id).limit(limit)).all()
+
+def _source(name, fields):
+    """Model, change timestamp column and loader options of a kind"""
+    if name == 'deleted':
+        return Tombstone, Tombstone.deleted_at, ()
+    if name == 'exams':
+        return Exam, Exam.updated_at, ()
+    model, parent = {
+        'questions': (Question, Question.exam_id),
+        'sub_questions': (SubQuestion, SubQuestion.question_id),
+        'sub_sections': (SubSection, SubSection.sub_question_id)
+    }[name]
+    return model, model.updated_at, (columns(model, fields, parent, model.updated_at),)
+
+def _stamp_of(row):
+    return row.deleted_at if isinstance(row, Tombstone) else row.updated_at
+
+def _row_dict(name, row, fields):
+    if name == 'deleted':
+        return {'type': row.node_type, 'id': row.node_id}
+    if name == 'exams':
+        return {
+            'id': row.id,
+            'year': row.year,
+            'subject': row.subject,
+            'province': row.province,
+            'month': row.month,
+            '_v': row._v
+        }
+    parent = {'questions': 'exam_id', 'sub_questions': 'question_id', 'sub_sections': 'sub_question_id'}[name]
+    return {
+        'id': row.id,
+        parent: getattr(row, parent),
+        **text_of(row, fields),
+        'sort_order': row.sort_order
+    }
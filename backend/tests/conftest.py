@@ -0,0 +1,81 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import event
+from config import Config
+from database import db
+from search import create_search_index
+from bulk import insert_exam_tree
+
+@pytest.fixture
+def app_factory(monkeypatch, tmp_path):
+    """create_app() on a throwaway SQLite file, with any other Config values overridden"""
+    def make(**config):
+        config.setdefault('SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'primary.db'}")
+        config.setdefault('SQLALCHEMY_BINDS', {})
+        config.setdefault('METRICS_ENABLED', False)
+        config.setdefault('SLOW_QUERY_MS', 0)
+        for key, value in config.items():
+            monkeypatch.setattr(Config, key, value)
+        from app import create_app
+        app = create_app()
+        app.config['TESTING'] = True
+        with app.app_context():
+            db.create_all(bind_key=None)
+            create_search_index()
+        return app
+    return make
+
+@pytest.fixture
+def app(app_factory):
+    return app_factory()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def exam_payload(questions=3, sub_questions=2, sub_sections=2, year=2023):
+    return {
+        'exam': {'year': year, 'subject': 'Mathematics', 'province': 'GP', 'month': 'November'},
+        'questions': [{
+            'stem': f'Question {q}',
+            'sub_questions': [{
+                'stem': f'Sub-question {q}.{sq} about functions',
+                'solutions': f'x = {sq}',
+                'sub_sections': [{
+                    'stem': f'Part {q}.{sq}.{ss}',
+                    'solutions': f'y = {ss}'
+                } for ss in range(1, sub_sections + 1)]
+            } for sq in range(1, sub_questions + 1)]
+        } for q in range(1, questions + 1)]
+    }
+
+def add_exam(app, **shape):
+    """Inserts and commits one exam tree, returning its id"""
+    with app.app_context():
+        exam = insert_exam_tree(exam_payload(**shape))
+        db.session.commit()
+        return exam.id
+
+class StatementCounter:
+    """Counts statements executed on an engine while active"""
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    @property
+    def count(self):
+        return len(self.statements)
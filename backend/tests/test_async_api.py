@@ -0,0 +1,32 @@
+"""The async read API honors the read_primary_until cookie set by Flask writes"""
+import time
+import pytest
+from starlette.testclient import TestClient
+from config import Config
+from database import db, STICKY_COOKIE
+from conftest import add_exam
+
+@pytest.fixture
+def async_client(app_factory, monkeypatch, tmp_path):
+    # The replica has the schema but lags behind: it has no exams yet
+    replica_url = f"sqlite:///{tmp_path / 'replica_0.db'}"
+    app = app_factory(SQLALCHEMY_BINDS={'replica_0': replica_url})
+    with app.app_context():
+        db.metadata.create_all(db.engines['replica_0'])
+    add_exam(app, questions=1, sub_questions=1, sub_sections=1)
+
+    monkeypatch.setattr(Config, 'SQLALCHEMY_BINDS', {'replica_0': {'url': replica_url}})
+    from async_api import create_async_app
+    with TestClient(create_async_app()) as client:
+        yield client
+
+def test_reads_replica_without_cookie(async_client):
+    assert async_client.get('/api/questions/1').status_code == 404
+
+def test_reads_primary_while_pinned(async_client):
+    async_client.cookies.set(STICKY_COOKIE, str(time.time() + 60))
+    assert async_client.get('/api/questions/1').status_code == 200
+
+def test_expired_cookie_reads_replica(async_client):
+    async_client.cookies.set(STICKY_COOKIE, str(time.time() - 1))
+    assert async_client.get('/api/questions/1').status_code == 404
@@ -0,0 +1,43 @@
+"""Batch creates check their input before writing and reject bad values with 400"""
+import pytest
+from conftest import add_exam
+
+ENDPOINTS = {
+    'questions': ('/api/questions/batch', 'exam_id'),
+    'sub_questions': ('/api/subquestions/batch', 'question_id'),
+    'sub_sections': ('/api/subsections/batch', 'sub_question_id'),
+}
+
+def post(client, key, items, parent_id=1):
+    url, parent = ENDPOINTS[key]
+    return client.post(url, json={parent: parent_id, key: items})
+
+@pytest.mark.parametrize('key', ENDPOINTS)
+@pytest.mark.parametrize('items, parent_id', [
+    ([{'stem': {'x': 1}, 'solutions': 's'}], 1),
+    ([{'stem': 'Find x', 'solutions': 's', 'sort_order': 'abc'}], 1),
+    ([{'stem': 'Find x', 'solutions': 's', 'sort_order': True}], 1),
+    (['Find x'], 1),
+    ([{'stem': 'Find x', 'solutions': 's'}], [1]),
+    ([{'stem': 'Find x', 'solutions': 's'}], '1'),
+])
+def test_bad_input_rejected(app, client, key, items, parent_id):
+    add_exam(app, questions=1, sub_questions=1, sub_sections=1)
+    response = post(client, key, items, parent_id)
+    assert response.status_code == 400
+    # Nothing was appended, so later batches still number from the stored children
+    assert post(client, key, [{'stem': 'Next', 'solutions': 's'}]).status_code == 201
+
+def test_bad_solutions_rejected(app, client):
+    add_exam(app, questions=1, sub_questions=1, sub_sections=1)
+    assert post(client, 'sub_questions', [{'stem': 'Find x', 'solutions': 5}]).status_code == 400
+    response = post(client, 'sub_sections', [{'stem': 'Find x'}])
+    assert response.status_code == 400
+    assert response.json['error'] == "Missing required field: 'solutions'"
+
+def test_numbering_after_valid_batch(app, client):
+    # Bulk inserts without sort_order give both questions sort_order 1
+    add_exam(app, questions=2, sub_questions=1, sub_sections=1)
+    response = post(client, 'questions', [{'stem': 'Q2'}, {'stem': 'Q9', 'sort_order': 9}, {'stem': None}])
+    assert response.status_code == 201
+    assert [q['question_number'] for q in response.json['questions']] == ['Q2', 'Q9', 'Q3']
@@ -0,0 +1,28 @@
+"""The cached /full tree is never served for a different exam or version"""
+from conftest import add_exam, exam_payload
+
+def test_recreated_exam_does_not_get_deleted_exams_tree(app, client):
+    add_exam(app)
+    exam_id = add_exam(app, questions=2)
+    assert len(client.get(f'/api/exams/{exam_id}/full').json['questions']) == 2
+
+    assert client.delete(f'/api/exams/{exam_id}').status_code == 200
+    payload = exam_payload(questions=0, year=1999)
+    response = client.post('/api/exams/', json={'exam': dict(payload['exam'], _v=1)})
+    assert response.status_code == 201
+    # SQLite hands the deleted exam's id out again
+    assert response.json['id'] == exam_id
+
+    tree = client.get(f'/api/exams/{exam_id}/full').json
+    assert tree['year'] == 1999
+    assert tree['questions'] == []
+
+def test_write_invalidates_cached_tree(app, client):
+    exam_id = add_exam(app, questions=1)
+    etag = client.get(f'/api/exams/{exam_id}/full').headers['ETag']
+
+    client.put('/api/questions/1', json={'stem': 'Changed'})
+    response = client.get(f'/api/exams/{exam_id}/full', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert response.json['questions'][0]['stem'] == 'Changed'
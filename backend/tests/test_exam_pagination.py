@@ -0,0 +1,39 @@
+"""Keyset pages of the catalogue are read in index order, with and without a subject filter"""
+import pytest
+from database import db
+from models import Exam
+from routes.exams import after_cursor, encode_cursor
+
+@pytest.mark.parametrize('filters, index', [
+    ({}, 'ix_exam_year_id'),
+    ({'subject': 'Mathematics'}, 'ix_exam_subject_year_id'),
+])
+def test_keyset_page_needs_no_sort(app, filters, index):
+    with app.app_context():
+        query = db.select(Exam).filter_by(**filters).where(
+            after_cursor(encode_cursor(2020, 5))
+        ).order_by(Exam.year, Exam.id).limit(50)
+        compiled = query.compile(db.engine, compile_kwargs={'literal_binds': True})
+        plan = ' | '.join(row[3] for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {compiled}')))
+
+    assert index in plan
+    assert 'TEMP B-TREE' not in plan
+
+def test_subject_pages_walk_the_whole_subject(app, client):
+    with app.app_context():
+        for year in (2021, 2019, 2020, 2019):
+            for subject in ('Mathematics', 'Physics'):
+                db.session.add(Exam(year=year, subject=subject, _v=1))
+        db.session.commit()
+
+    seen = []
+    cursor = None
+    while True:
+        response = client.get('/api/exams/', query_string={'subject': 'Physics', 'limit': 3, 'cursor': cursor or ''})
+        seen += [(e['year'], e['id']) for e in response.json['exams']]
+        cursor = response.json['next_cursor']
+        if cursor is None:
+            break
+
+    assert seen == sorted(seen)
+    assert len(seen) == 4
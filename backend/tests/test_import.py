@@ -0,0 +1,27 @@
+"""NDJSON imports are split into lines chunk by chunk, not byte by byte"""
+import io
+import json
+import pytest
+from utils import iter_lines
+from conftest import exam_payload
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 64 * 1024])
+@pytest.mark.parametrize('body', [
+    b'',
+    b'\n',
+    b'{"a": 1}\n{"b": 2}\n',
+    b'{"a": 1}\n\n{"b": 2}',
+    b'x' * 100 + b'\n' + b'y' * 50,
+])
+def test_iter_lines_matches_split(body, chunk_size):
+    expected = body.split(b'\n')
+    if expected[-1] == b'':
+        expected.pop()
+    assert list(iter_lines(io.BytesIO(body), chunk_size)) == expected
+
+def test_import_reports_each_line(client):
+    lines = [json.dumps(exam_payload(questions=1, year=year)) for year in (2020, 2021)]
+    body = '\n'.join([lines[0], '', '{"exam": {}}', lines[1]]) + '\n'
+    response = client.post('/api/exams/import', data=body, content_type='application/x-ndjson')
+    results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [(r['line'], r['status']) for r in results] == [(1, 'created'), (3, 'error'), (4, 'created')]
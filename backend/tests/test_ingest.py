@@ -0,0 +1,84 @@
+"""Directory ingestion and its parse cache"""
+import os
+import shutil
+import pytest
+from database import db
+from models import Exam
+import ingest
+from ingest import ingest_directory
+from parse_cache import ParseCache
+from parsers.pdf_parser import iter_questions_from_blocks
+from utils import to_bulk_question
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+DEFAULTS = {'year': 2023, 'subject': 'Mathematics', 'province': None, 'month': None}
+
+@pytest.fixture
+def papers(tmp_path):
+    directory = tmp_path / 'papers'
+    directory.mkdir()
+    for i, name in enumerate(('a.md', 'b.md', 'c.md', 'd.md', 'e.md')):
+        shutil.copy(os.path.join(DATA, 'sample_paper.md'), directory / name)
+        # Different bytes, so the papers get different cache keys
+        with open(directory / name, 'a') as f:
+            f.write('\n' * i)
+    return str(directory)
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ParseCache(str(tmp_path / 'parse_cache.sqlite3'), 10 * 1024 * 1024)
+    yield cache
+    cache.close()
+
+def cached_exam_ids(cache):
+    return [row[0] for row in cache._conn.execute('SELECT exam_id FROM parse_cache ORDER BY exam_id')]
+
+def test_rerun_skips_committed_papers(app, papers, cache):
+    with app.app_context():
+        first = ingest_directory(papers, DEFAULTS, workers=1, cache=cache)
+        second = ingest_directory(papers, DEFAULTS, workers=1, cache=cache)
+
+    assert first['files'] == 5 and not first['failed']
+    assert cached_exam_ids(cache) == [1, 2, 3, 4, 5]
+    assert second['files'] == 0 and second['unchanged'] == 5
+
+def test_cached_rewrites_commit_in_batches(app, papers, cache, monkeypatch):
+    with app.app_context():
+        ingest_directory(papers, DEFAULTS, workers=1, cache=cache)
+        # A database reset leaves every file a cache hit whose exam is gone
+        db.session.execute(db.delete(Exam))
+        db.session.commit()
+
+        batches = []
+        commit_batch = ingest._commit_batch
+        monkeypatch.setattr(ingest, '_commit_batch', lambda cache, uncommitted: (
+            batches.append(len(uncommitted)), commit_batch(cache, uncommitted)
+        ))
+        stats = ingest_directory(papers, DEFAULTS, workers=1, batch_size=2, cache=cache)
+
+    assert stats['files'] == 5
+    assert batches == [2, 2, 1]
+
+def test_cache_entries_wait_for_commit(app, papers, cache, monkeypatch):
+    with app.app_context():
+        def failing_commit():
+            raise RuntimeError('commit failed')
+        monkeypatch.setattr(db.session, 'commit', failing_commit)
+        with pytest.raises(RuntimeError):
+            ingest_directory(papers, DEFAULTS, workers=1, cache=cache)
+
+    assert cached_exam_ids(cache) == []
+
+def test_pdf_and_markdown_questions_map_alike():
+    blocks = [
+        (1, {'block_type': 'SectionHeader', 'html': '<h1>QUESTION 1</h1>'}),
+        (1, {'block_type': 'Text', 'html': '<p>Consider f(x).</p>'}),
+        (1, {'block_type': 'ListGroup', 'children': [{'block_type': 'ListItem', 'html': '<li>Find f(2). (3)</li>'}]}),
+    ]
+    question = next(iter_questions_from_blocks(blocks))
+
+    assert to_bulk_question(question, 1) == {
+        'stem': 'Consider f(x).',
+        'sort_order': 1,
+        'sub_questions': [{'stem': 'Find f(2).', 'solutions': None, 'sort_order': 1}]
+    }
@@ -0,0 +1,26 @@
+"""Per-parent listings count only the children of that parent"""
+from database import db
+from conftest import StatementCounter, add_exam
+
+def test_questions_by_exam_counts_only_its_subquestions(app, client):
+    add_exam(app, questions=2, sub_questions=3)
+    exam_id = add_exam(app, questions=2, sub_questions=1)
+
+    with app.app_context():
+        engine = db.engine
+    with StatementCounter(engine) as counter:
+        response = client.get(f'/api/questions/by-exam/{exam_id}')
+
+    assert response.status_code == 200
+    assert [q['sub_questions_count'] for q in response.json['questions']] == [1, 1]
+    count_query = next(s for s in counter.statements if 'count(*)' in s)
+    assert 'sub_question.question_id IN (SELECT question.id' in count_query
+
+def test_subquestions_by_question_counts_only_its_subsections(app, client):
+    add_exam(app, questions=1, sub_questions=2, sub_sections=4)
+    add_exam(app, questions=1, sub_questions=2, sub_sections=1)
+
+    response = client.get('/api/subquestions/by-question/2')
+
+    assert response.status_code == 200
+    assert [sq['sub_sections_count'] for sq in response.json['subquestions']] == [1, 1]
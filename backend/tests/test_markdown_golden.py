@@ -0,0 +1,23 @@
+"""Markdown cleaning and parsing still produce the recorded output for the sample paper"""
+import json
+import os
+import pytest
+from utils import clean_markdown_line
+from parsers.markdown_parser import parse_markdown
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+@pytest.fixture(scope='module')
+def sample():
+    with open(os.path.join(DATA, 'sample_paper.md'), newline='') as f:
+        text = f.read()
+    with open(os.path.join(DATA, 'sample_paper.golden.json')) as f:
+        return text, json.load(f)
+
+def test_clean_markdown_line_matches_golden(sample):
+    text, golden = sample
+    assert [clean_markdown_line(line) for line in text.split('\n')] == golden['lines']
+
+def test_parse_markdown_matches_golden(sample):
+    text, golden = sample
+    assert parse_markdown(text) == golden['questions']
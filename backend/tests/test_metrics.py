@@ -0,0 +1,26 @@
+"""Per-thread metric shards of finished threads are folded away, not kept forever"""
+import threading
+from metrics import metrics
+
+def live_requests():
+    return sum(
+        sum(histogram.counts)
+        for (endpoint, _, _), histogram in metrics.collect().latency.items()
+        if endpoint == 'health.liveness'
+    )
+
+def test_finished_thread_shards_are_retired(app_factory):
+    app = app_factory(METRICS_ENABLED=True)
+    before = live_requests()
+
+    def request_once():
+        assert app.test_client().get('/health/live').status_code == 200
+
+    # One thread per request, as a thread-per-request server would
+    for _ in range(20):
+        thread = threading.Thread(target=request_once)
+        thread.start()
+        thread.join()
+
+    assert live_requests() == before + 20
+    assert all(thread.is_alive() for thread in metrics._shards)
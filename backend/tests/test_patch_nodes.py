@@ -0,0 +1,35 @@
+"""PATCH /api/exams/{id}/nodes rejects values of the wrong type with 400"""
+import pytest
+from conftest import add_exam
+
+@pytest.mark.parametrize('changes', [
+    {'questions': [{'id': 1, 'sort_order': '2'}]},
+    {'questions': [{'id': 1, 'sort_order': True}]},
+    {'questions': [{'id': 1, 'sort_order': 1.5}]},
+    {'sub_questions': [{'id': 1, 'sort_order': None}]},
+    {'sub_questions': [{'id': 1, 'stem': 5}]},
+    {'sub_questions': [{'id': 1, 'solutions': ['x = 1']}]},
+    {'sub_sections': [{'id': 1, 'stem': None}]},
+    {'sub_sections': [{'id': 1, 'solutions': {'text': 'y'}}]},
+])
+def test_wrong_types_rejected(app, client, changes):
+    exam_id = add_exam(app, questions=1, sub_questions=1, sub_sections=1)
+    response = client.patch(f'/api/exams/{exam_id}/nodes', json=changes)
+    assert response.status_code == 400
+    assert 'must be' in response.json['error']
+
+def test_valid_types_applied(app, client):
+    exam_id = add_exam(app, questions=2, sub_questions=1, sub_sections=1)
+    response = client.patch(f'/api/exams/{exam_id}/nodes', json={
+        'questions': [{'id': 1, 'sort_order': 2}, {'id': 2, 'sort_order': 1}],
+        'sub_questions': [{'id': 1, 'stem': 'New stem', 'solutions': None}],
+        'sub_sections': [{'id': 1, 'solutions': 'y = 3'}]
+    })
+    assert response.status_code == 200
+    assert response.json['updated'] == {'questions': 2, 'sub_questions': 1, 'sub_sections': 1}
+
+    tree = client.get(f'/api/exams/{exam_id}/full').json
+    assert [q['id'] for q in tree['questions']] == [2, 1]
+    sub_question = tree['questions'][1]['sub_questions'][0]
+    assert sub_question['stem'] == 'New stem' and sub_question['solutions'] is None
+    assert sub_question['sub_sections'][0]['solutions'] == 'y = 3'
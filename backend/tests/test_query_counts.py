@@ -0,0 +1,39 @@
+"""The tree endpoints issue a fixed number of statements however large the tree is"""
+import pytest
+from database import db
+from conftest import StatementCounter, add_exam
+
+@pytest.fixture
+def engine(app):
+    with app.app_context():
+        return db.engine
+
+@pytest.mark.parametrize('shape', [
+    {'questions': 1, 'sub_questions': 1, 'sub_sections': 1},
+    {'questions': 6, 'sub_questions': 4, 'sub_sections': 3},
+])
+def test_full_exam_statement_count(app, client, engine, shape):
+    exam_id = add_exam(app, **shape)
+
+    with StatementCounter(engine) as counter:
+        response = client.get(f'/api/exams/{exam_id}/full')
+
+    assert response.status_code == 200
+    assert len(response.json['questions']) == shape['questions']
+    # Exam, questions, subquestions, subsections
+    assert counter.count == 4
+
+@pytest.mark.parametrize('shape', [
+    {'questions': 1, 'sub_questions': 1, 'sub_sections': 1},
+    {'questions': 2, 'sub_questions': 5, 'sub_sections': 4},
+])
+def test_question_statement_count(app, client, engine, shape):
+    add_exam(app, **shape)
+
+    with StatementCounter(engine) as counter:
+        response = client.get('/api/questions/1')
+
+    assert response.status_code == 200
+    assert len(response.json['sub_questions']) == shape['sub_questions']
+    # Question, subquestions, subsections
+    assert counter.count == 3
@@ -0,0 +1,42 @@
+"""Reads go to one replica per request, and writes pin the client to the primary"""
+import json
+import shutil
+from contextlib import ExitStack
+import pytest
+from database import db, STICKY_COOKIE
+from conftest import StatementCounter, add_exam, exam_payload
+
+@pytest.fixture
+def replica_app(app_factory, tmp_path):
+    app = app_factory(SQLALCHEMY_BINDS={
+        f'replica_{i}': f"sqlite:///{tmp_path / f'replica_{i}.db'}" for i in range(2)
+    })
+    add_exam(app, questions=2, sub_questions=3, sub_sections=2)
+    for i in range(2):
+        shutil.copy(tmp_path / 'primary.db', tmp_path / f'replica_{i}.db')
+    return app
+
+def engines(app):
+    with app.app_context():
+        return db.engines
+
+def test_request_reads_one_replica(replica_app):
+    client = replica_app.test_client()
+    engine_map = engines(replica_app)
+    for _ in range(10):
+        with ExitStack() as stack:
+            counters = {key: stack.enter_context(StatementCounter(engine)) for key, engine in engine_map.items()}
+            assert client.get('/api/questions/1').status_code == 200
+        used = {key for key, counter in counters.items() if counter.count}
+        assert len(used) == 1
+        assert used.pop() in ('replica_0', 'replica_1')
+
+def test_import_pins_reads_to_primary(replica_app):
+    client = replica_app.test_client()
+    body = json.dumps(exam_payload(questions=1, sub_questions=1, sub_sections=1)) + '\n'
+    response = client.post('/api/exams/import', data=body, content_type='application/x-ndjson')
+    assert json.loads(response.get_data(as_text=True))['status'] == 'created'
+    assert client.get_cookie(STICKY_COOKIE) is not None
+
+    # The new exam is only on the primary
+    assert client.get('/api/exams/2/full').status_code == 200
@@ -0,0 +1,72 @@
+"""Full-text search: index upkeep through the triggers, filters and paging"""
+from sqlalchemy import text
+from database import db
+import search
+from conftest import exam_payload
+
+def hits(client, **query):
+    response = client.get('/api/search/', query_string=query)
+    assert response.status_code == 200
+    return response.json
+
+def post_exam(client, year=2023, subject='Mathematics', stem='Solve the quadratic'):
+    payload = exam_payload(questions=1, sub_questions=1, sub_sections=1, year=year)
+    payload['exam']['subject'] = subject
+    payload['questions'][0]['sub_questions'][0]['stem'] = stem
+    response = client.post('/api/exams/bulk', json=payload)
+    assert response.status_code == 201
+    return response.json['exam_id']
+
+def found(client, q, **filters):
+    return [(hit['type'], hit['id']) for hit in hits(client, q=q, **filters)['results']]
+
+def test_triggers_follow_inserts_updates_and_deletes(client):
+    post_exam(client)
+    assert found(client, 'quadratic') == [('sub_question', 1)]
+
+    assert client.put('/api/subquestions/1', json={'stem': 'Sketch the hyperbola'}).status_code == 200
+    assert found(client, 'quadratic') == []
+    assert found(client, 'hyperbola') == [('sub_question', 1)]
+
+    # Deleting the question cascades to its subquestion and subsection rows
+    assert found(client, 'Part') == [('sub_section', 1)]
+    assert client.delete('/api/questions/1').status_code == 200
+    assert found(client, 'hyperbola') == []
+    assert found(client, 'Part') == []
+
+def test_subject_and_year_filters(client):
+    post_exam(client, year=2022, subject='Mathematics')
+    post_exam(client, year=2023, subject='Mathematics')
+    post_exam(client, year=2023, subject='Physics')
+
+    assert {hit['exam_id'] for hit in hits(client, q='quadratic')['results']} == {1, 2, 3}
+    assert {hit['exam_id'] for hit in hits(client, q='quadratic', subject='Physics')['results']} == {3}
+    assert {hit['exam_id'] for hit in hits(client, q='quadratic', year=2023)['results']} == {2, 3}
+    assert hits(client, q='quadratic', year=2023, subject='Chemistry')['results'] == []
+
+def test_paging(client):
+    for _ in range(5):
+        post_exam(client)
+    seen = []
+    offset = 0
+    while offset is not None:
+        page = hits(client, q='quadratic', limit=2, offset=offset)
+        assert len(page['results']) <= 2
+        seen += [hit['id'] for hit in page['results']]
+        offset = page['next_offset']
+    assert sorted(seen) == [1, 2, 3, 4, 5]
+
+def test_missing_index_created_on_first_search(app, client, monkeypatch):
+    post_exam(client)
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(text('DROP TABLE search_index'))
+            for kind in search.KINDS.values():
+                for suffix in ('ai', 'au', 'ad'):
+                    connection.execute(text(f'DROP TRIGGER {kind}_search_{suffix}'))
+    # A fresh process, which has not checked this database yet
+    monkeypatch.setattr(search, '_indexed_engines', set())
+
+    assert found(client, 'quadratic') == [('sub_question', 1)]
+    post_exam(client, stem='Quadratic inequalities')
+    assert found(client, 'inequalities') == [('sub_question', 2)]
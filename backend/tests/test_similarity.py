@@ -0,0 +1,98 @@
+"""Bulk inserts queue exams for the near-duplicate index, and edits and deletes keep it clean"""
+import time
+from database import db
+from models import Exam, SubQuestion, SimilaritySignature, SimilarityBucket, SimilarityPending
+from similarity import find_similar, index_nodes, index_pending
+from conftest import add_exam, exam_payload
+
+def index_rows(app):
+    with app.app_context():
+        return (
+            db.session.query(SimilaritySignature).count(),
+            db.session.query(SimilarityBucket).count()
+        )
+
+def indexed_exam(app, **shape):
+    exam_id = add_exam(app, **shape)
+    with app.app_context():
+        index_pending()
+    return exam_id
+
+def test_bulk_insert_queues_instead_of_indexing(app):
+    exam_id = add_exam(app, questions=2, sub_questions=2, sub_sections=1)
+    with app.app_context():
+        assert db.session.scalars(db.select(SimilarityPending.exam_id)).all() == [exam_id]
+    assert index_rows(app) == (0, 0)
+
+    with app.app_context():
+        assert index_pending() == 1
+        assert db.session.query(SimilarityPending).count() == 0
+    # Four subquestions and four subsections
+    assert index_rows(app)[0] == 8
+
+def test_bulk_request_drains_queue_after_response(app, client):
+    response = client.post('/api/exams/bulk', json=exam_payload(questions=1, sub_questions=2, sub_sections=0))
+    assert response.status_code == 201
+
+    deadline = time.monotonic() + 10
+    while index_rows(app)[0] < 2 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert index_rows(app)[0] == 2
+    with app.app_context():
+        assert db.session.query(SimilarityPending).count() == 0
+
+def test_clearing_stem_drops_entries(app, client):
+    indexed_exam(app, questions=1, sub_questions=1, sub_sections=0)
+    assert index_rows(app) == (1, 12)
+
+    response = client.put('/api/subquestions/1', json={'stem': ''})
+    assert response.status_code == 200
+    assert index_rows(app) == (0, 0)
+
+def test_deletes_drop_subtree_entries(app, client):
+    indexed_exam(app, questions=2, sub_questions=2, sub_sections=2)
+    other_exam = indexed_exam(app, questions=1, sub_questions=1, sub_sections=1)
+    # 2 * 2 subquestions and 8 subsections, then 1 + 1
+    assert index_rows(app)[0] == 14
+
+    assert client.delete('/api/subquestions/1').status_code == 200
+    assert index_rows(app)[0] == 11
+    assert client.delete('/api/questions/2').status_code == 200
+    assert index_rows(app)[0] == 5
+    assert client.delete('/api/exams/1').status_code == 200
+    assert index_rows(app) == (2, 24)
+    assert client.delete(f'/api/exams/{other_exam}').status_code == 200
+    assert index_rows(app) == (0, 0)
+
+def test_find_similar_fills_limit_past_deleted_nodes(app):
+    exam_id = indexed_exam(app, questions=1, sub_questions=8, sub_sections=0)
+    with app.app_context():
+        ids = db.session.scalars(db.select(SubQuestion.id).order_by(SubQuestion.id)).all()
+        stem = 'Find the turning point of the parabola'
+        db.session.execute(db.update(SubQuestion).values(stem=stem))
+        index_nodes('sub_question', [(node_id, stem) for node_id in ids])
+        # Delete the best matches behind the index's back, as a concurrent delete would
+        db.session.execute(db.delete(SubQuestion).where(SubQuestion.id.in_(ids[1:4])))
+        db.session.commit()
+
+        similar = find_similar('sub_question', ids[0], limit=3)
+    assert [node['id'] for node in similar] == ids[4:7]
+    assert all(node['exam_id'] == exam_id for node in similar)
+
+def test_reused_exam_id_queues_again(app):
+    exam_id = add_exam(app, questions=1, sub_questions=1, sub_sections=0)
+    with app.app_context():
+        # Deleted before the queue was drained, so SQLite hands the id out again
+        db.session.execute(db.delete(Exam))
+        db.session.commit()
+    assert add_exam(app, questions=1, sub_questions=1, sub_sections=0) == exam_id
+
+    with app.app_context():
+        assert index_pending() == 1
+    assert index_rows(app) == (1, 12)
+
+def test_exam_delete_unqueues_it(app, client):
+    exam_id = add_exam(app, questions=1, sub_questions=1, sub_sections=0)
+    assert client.delete(f'/api/exams/{exam_id}').status_code == 200
+    with app.app_context():
+        assert db.session.query(SimilarityPending).count() == 0
@@ -0,0 +1,66 @@
+"""Delta sync: token paging, tombstones and the overlap window"""
+from conftest import add_exam
+
+KINDS = ('exams', 'questions', 'sub_questions', 'sub_sections')
+
+def sync_all(client, since=None, limit=3):
+    """Follows sync_token until has_more is false; returns the pages and the final token"""
+    pages = []
+    while True:
+        query = {'limit': limit}
+        if since:
+            query['since'] = since
+        response = client.get('/api/sync/', query_string=query)
+        assert response.status_code == 200
+        pages.append(response.json)
+        since = response.json['sync_token']
+        if not response.json['has_more']:
+            return pages, since
+
+def ids(pages, kind):
+    return [row['id'] for page in pages for row in page[kind]]
+
+def test_paging_returns_every_row_once(app_factory):
+    app = app_factory(SYNC_OVERLAP_SECONDS=0)
+    add_exam(app, questions=2, sub_questions=2, sub_sections=2)
+    add_exam(app, questions=1, sub_questions=1, sub_sections=1)
+    client = app.test_client()
+
+    pages, token = sync_all(client, limit=3)
+
+    assert all(sum(len(page[kind]) for kind in KINDS + ('deleted',)) <= 3 for page in pages)
+    assert ids(pages, 'exams') == [1, 2]
+    assert sorted(ids(pages, 'questions')) == [1, 2, 3]
+    assert sorted(ids(pages, 'sub_questions')) == list(range(1, 6))
+    assert sorted(ids(pages, 'sub_sections')) == list(range(1, 10))
+    # Nothing changed since, and no overlap
+    pages, _ = sync_all(client, token)
+    assert not any(ids(pages, kind) for kind in KINDS + ('deleted',))
+
+def test_deletes_arrive_as_tombstones(app_factory):
+    app = app_factory(SYNC_OVERLAP_SECONDS=0)
+    add_exam(app, questions=2, sub_questions=1, sub_sections=1)
+    client = app.test_client()
+    _, token = sync_all(client)
+
+    assert client.delete('/api/questions/2').status_code == 200
+    assert client.put('/api/subquestions/1', json={'stem': 'Edited'}).status_code == 200
+    pages, _ = sync_all(client, token)
+
+    assert [row for page in pages for row in page['deleted']] == [{'type': 'question', 'id': 2}]
+    assert ids(pages, 'sub_questions') == [1]
+    assert ids(pages, 'questions') == []
+
+def test_overlap_window_resends_recent_rows(app_factory):
+    app = app_factory(SYNC_OVERLAP_SECONDS=30)
+    add_exam(app, questions=1, sub_questions=1, sub_sections=1)
+    client = app.test_client()
+    _, token = sync_all(client)
+
+    # Written within the last 30 seconds of the previous sync, so sent again
+    pages, _ = sync_all(client, token)
+    assert ids(pages, 'exams') == [1]
+    assert ids(pages, 'sub_sections') == [1]
+
+def test_malformed_token_rejected(client):
+    assert client.get('/api/sync/', query_string={'since': 'not-a-token'}).status_code == 400
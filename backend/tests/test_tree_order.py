@@ -0,0 +1,44 @@
+"""Buffered and streamed trees order tied siblings the same way, by id"""
+import json
+import pytest
+from database import db
+from conftest import StatementCounter, add_exam
+
+@pytest.fixture
+def engine(app):
+    with app.app_context():
+        return db.engine
+
+def test_tied_sort_orders_fall_back_to_id(app, client):
+    exam_id = add_exam(app, questions=4, sub_questions=3, sub_sections=2)
+    response = client.patch(f'/api/exams/{exam_id}/nodes', json={
+        'questions': [{'id': 1, 'sort_order': 2}, {'id': 2, 'sort_order': 1},
+                      {'id': 3, 'sort_order': 2}, {'id': 4, 'sort_order': 1}],
+        'sub_questions': [{'id': 1, 'sort_order': 5}]
+    })
+    assert response.status_code == 200
+
+    buffered = client.get(f'/api/exams/{exam_id}/full').get_data()
+    streamed = client.get(f'/api/exams/{exam_id}/full?stream=1').get_data()
+    assert json.loads(buffered) == json.loads(streamed)
+
+    questions = json.loads(buffered)['questions']
+    assert [q['id'] for q in questions] == [2, 4, 1, 3]
+    assert [sq['id'] for sq in questions[2]['sub_questions']] == [2, 3, 1]
+    # Bulk inserts give every subsection sort_order 1
+    assert [ss['id'] for ss in questions[0]['sub_questions'][0]['sub_sections']] == [7, 8]
+
+def test_question_by_exam_listing_order(app, client):
+    exam_id = add_exam(app, questions=3, sub_questions=1, sub_sections=0)
+    client.patch(f'/api/exams/{exam_id}/nodes', json={'questions': [{'id': 1, 'sort_order': 2}]})
+    listed = client.get(f'/api/questions/by-exam/{exam_id}').json['questions']
+    assert [q['id'] for q in listed] == [2, 3, 1]
+
+def test_child_loads_order_by_id(app, client, engine):
+    exam_id = add_exam(app, questions=1, sub_questions=1, sub_sections=1)
+    with StatementCounter(engine) as counter:
+        client.get(f'/api/exams/{exam_id}/full')
+    # SQLite usually returns ties in id order anyway, so check the SQL asks for it
+    for table in ('question', 'sub_question', 'sub_section'):
+        [statement] = [s for s in counter.statements if f'FROM {table} ' in s]
+        assert f'ORDER BY {table}.sort_order, {table}.id' in statement
@@ -0,0 +1,24 @@
+"""init-db adds columns declared since a database was created, keeping NOT NULL"""
+from datetime import datetime
+from database import db
+from models import Question
+from conftest import add_exam
+
+def test_init_db_adds_updated_at_not_null(app):
+    add_exam(app, questions=1, sub_questions=1, sub_sections=1)
+    with app.app_context():
+        # A database from before updated_at existed
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('DROP INDEX ix_question_updated')
+            connection.exec_driver_sql('ALTER TABLE question DROP COLUMN updated_at')
+
+    result = app.test_cli_runner().invoke(args=['init-db'])
+    assert 'Added column question.updated_at' in result.output
+
+    with app.app_context():
+        column = next(c for c in db.inspect(db.engine).get_columns('question') if c['name'] == 'updated_at')
+        assert column['nullable'] is False
+        stamps = db.session.execute(db.text('SELECT updated_at FROM question')).scalars().all()
+        assert stamps and all(stamps)
+        assert 'ix_question_updated' in {i['name'] for i in db.inspect(db.engine).get_indexes('question')}
+        assert isinstance(db.session.get(Question, 1).updated_at, datetime)
@@ -1,5 +1,18 @@
 import re
 
+# Compiled once at import; each pattern below only runs when a cheap string
+# test shows it could change the line
+_HEADER = re.compile(r'^\#{1,3}\s*(\*{2})?')
+_HORIZONTAL_RULE = re.compile(r'^\s*[\-\*]{3,}\s*$')
+_PAGE_TOTAL = re.compile(r'\[\d+\]\s*$')
+_PAREN_NUMS = re.compile(r'\(\d+\)')
+_MULTI_SPACE = re.compile(r'\s{2,}')
+_TABLE_RULE_CHARS = '|:- '
+
+# Question numbers like 1.2 and sub-question numbers like 1.2.3, told apart
+# by whether the third group matched
+_NUMBERED_LINE = re.compile(r'^(\d+\.\d+)(\.\d+)?(?:\s+(.*))?$')
+
 def clean_markdown_line(line):
     """
     Cleans markdown line by:
@@ -9,28 +22,100 @@ def clean_markdown_line(line):
     - Removing section headers
     """
     # Remove table borders and separators
-    if re.match(r'^[\|:\- ]+$', line.strip()):
+    stripped = line.strip()
+    if stripped and not stripped.strip(_TABLE_RULE_CHARS):
         return None
-        
+
     # Remove header formatting but keep text
-    line = re.sub(r'^\#{1,3}\s*(\*{2})?', '', line)
-    line = re.sub(r'(\*{2})?\s*$', '', line)
-    
+    if line.startswith('#'):
+        line = _HEADER.sub('', line)
+
+    # Trailing whitespace, and a closing ** directly before it
+    line = line.rstrip()
+    if line.endswith('**'):
+        line = line[:-2]
+
     # Remove table pipes while preserving content
     if '|' in line:
         # Extract content from table cells
         cells = [cell.strip() for cell in line.split('|') if cell.strip()]
         line = ' '.join(cells)
-    
+
     # Remove horizontal rules
-    line = re.sub(r'^\s*[\-\*]{3,}\s*$', '', line)
-    
+    if '-' in line or '*' in line:
+        line = _HORIZONTAL_RULE.sub('', line)
+
     # Remove page numbers and totals like [18]
-    line = re.sub(r'\[\d+\]\s*$', '', line)
-    
+    if ']' in line:
+        line = _PAGE_TOTAL.sub('', line)
+
     #Remove marks
-    _remove_all_paren_nums = re.compile(r'\(\d+\)')
-    line = _remove_all_paren_nums.sub('', line)
-    line = re.sub(r'\s{2,}', ' ', line).strip()
+    if '(' in line:
+        line = _PAREN_NUMS.sub('', line)
+    return _MULTI_SPACE.sub(' ', line).strip()
 
-    return line.strip()
\ No newline at end of file
+def classify_numbered_line(cleaned):
+    """
+    Returns ('question', number, text), ('sub_question', number, text) or
+    None for a cleaned line, with text '' when nothing follows the number.
+    """
+    if not cleaned[:1].isdigit():
+        return None
+    match = _NUMBERED_LINE.match(cleaned)
+    if not match:
+        return None
+    if match.group(2):
+        return 'sub_question', match.group(1) + match.group(2), match.group(3) or ''
+    return 'question', match.group(1), match.group(3) or ''
+
+def parse_ids(value, max_ids):
+    """
+    Comma-separated ids from a query parameter, deduplicated in request
+    order. Raises ValueError when it is empty, malformed or too long.
+    """
+    if not value:
+        raise ValueError('ids is required')
+    try:
+        ids = list(dict.fromkeys(int(part) for part in value.split(',') if part.strip()))
+    except ValueError:
+        raise ValueError(f"ids must be comma-separated integers: {value}")
+    if not ids:
+        raise ValueError('ids is required')
+    if len(ids) > max_ids:
+        raise ValueError(f"At most {max_ids} ids per request")
+    return ids
+
+def to_bulk_question(question, sort_order):
+    """Maps a question from either parser onto the /api/exams/bulk question payload"""
+    return {
+        'stem': question['stem'],
+        'sort_order': sort_order,
+        'sub_questions': [{
+            'stem': sq['content'],
+            'solutions': None,
+            'sort_order': i
+        } for i, sq in enumerate(question['sub_questions'], start=1)]
+    }
+
+def iter_lines(stream, chunk_size=64 * 1024):
+    """
+    Lines of a binary stream without their newlines, read chunk_size bytes
+    at a time. Iterating a werkzeug request stream directly reads each line
+    one byte per call.
+    """
+    partial = []
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = chunk.split(b'\n')
+        if len(lines) == 1:
+            # A line longer than a chunk is joined once, when its end arrives
+            partial.append(chunk)
+            continue
+        partial.append(lines[0])
+        yield b''.join(partial)
+        yield from lines[1:-1]
+        partial = [lines[-1]]
+    if any(partial):
+        yield b''.join(partial)
@@ -0,0 +1,9 @@
+"""
+WSGI entry point. The app does no database work while it is created, so a
+prefork server can import it once in the master and fork the workers:
+
+    gunicorn --preload -w 4 wsgi:app
+"""
+from app import create_app
+
+app = create_app()